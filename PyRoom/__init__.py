@@ -1,6 +1,10 @@
 # -*- coding:utf-8 -*-
 
 __VERSION__ = '0.4.2'
+import time
+# when we started to be imported, for --profile-startup
+STARTED = time.time()
+
 import locale
 locale.setlocale(locale.LC_ALL, '')
 
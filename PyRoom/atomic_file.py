@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+
+"""
+crash safe file writing
+
+Text is streamed into a temporary file next to the target, flushed to disk
+and then renamed over the target, so after a crash the file is either
+completely old or completely new.
+"""
+
+import errno
+import os
+import tempfile
+from sys import platform
+
+# read once while we are still single threaded, os.umask can only be
+# queried by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def write_atomically(filename, chunks):
+    """write an iterable of byte strings to filename
+
+    mode and ownership of an existing file are kept; if its directory isn't
+    writable we fall back to overwriting the file in place"""
+    filename = os.path.realpath(filename)
+    directory = os.path.dirname(filename)
+    try:
+        file_descriptor, temporary_filename = tempfile.mkstemp(
+            prefix='.%s.' % os.path.basename(filename),
+            suffix='.pyroom-tmp',
+            dir=directory
+        )
+    except OSError, error:
+        if error.errno not in (errno.EACCES, errno.EPERM):
+            raise
+        _write_in_place(filename, chunks)
+        return
+    try:
+        temporary_file = os.fdopen(file_descriptor, 'wb')
+        try:
+            _write_chunks(temporary_file, chunks)
+        finally:
+            temporary_file.close()
+        _copy_ownership_and_mode(filename, temporary_filename)
+        if platform == 'win32' and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(temporary_filename, filename)
+    except:
+        if os.path.exists(temporary_filename):
+            os.remove(temporary_filename)
+        raise
+    _sync_directory(directory)
+
+
+def _write_chunks(open_file, chunks):
+    for chunk in chunks:
+        open_file.write(chunk)
+    open_file.flush()
+    os.fsync(open_file.fileno())
+
+
+def _write_in_place(filename, chunks):
+    open_file = open(filename, 'wb')
+    try:
+        _write_chunks(open_file, chunks)
+    finally:
+        open_file.close()
+
+
+def _copy_ownership_and_mode(original_filename, new_filename):
+    """make the new file look like the one it replaces"""
+    try:
+        original = os.stat(original_filename)
+    except OSError:
+        os.chmod(new_filename, 0666 & ~_UMASK)
+        return
+    os.chmod(new_filename, original.st_mode & 07777)
+    if hasattr(os, 'chown'):
+        try:
+            os.chown(new_filename, original.st_uid, original.st_gid)
+        except OSError:
+            # only root may give files away, keep our own ownership then
+            pass
+
+
+def _sync_directory(directory):
+    """make the rename itself durable"""
+    if platform == 'win32':
+        return
+    try:
+        directory_descriptor = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(directory_descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(directory_descriptor)
@@ -21,35 +21,145 @@
 
 """
 provide autosave functions
+
+Nothing runs while nobody types: the first edit after a backup arms a single
+deadline, which fires once the user paused for AUTOSAVE_IDLE_PAUSE seconds
+or at the latest after the configured autosave time. Only buffers that
+changed since their last backup are written.
+
+A backup is a checkpoint of the whole text plus a journal of the edits made
+since, so most autosaves only append what was typed. The checkpoint is
+rewritten once the journal has grown about as big as the document.
 """
 import gobject
 from pyroom_error import PyroomError
+from edit_journal import JournalSave, read_journal
+from tracing import traced
+import functools
+import math
 import os
+import time
+import weakref
+
+AUTOSAVE_IDLE_PAUSE = 10
+# journals smaller than this are never compacted
+MIN_COMPACT_SIZE = 64 * 1024
+JOURNAL_RECORD_OVERHEAD = 16
+# edits waiting for the journal beyond this are replaced by a checkpoint
+MAX_PENDING_EDITS_SIZE = 1024 * 1024
+
+
+class BackupState(object):
+    """what the backup files of a buffer hold"""
+    __slots__ = ('generation', 'needs_checkpoint', 'edits', 'edits_size',
+                 'journal_size')
+
+    def __init__(self):
+        self.generation = None
+        self.journal_size = 0
+        self.drop_edits()
+
+    def reset(self, generation):
+        """the backup can't be continued, start over with a checkpoint"""
+        self.generation = generation
+        self.journal_size = 0
+        self.drop_edits()
+
+    def drop_edits(self):
+        """the next backup is a checkpoint, no need to keep edits for it"""
+        self.needs_checkpoint = True
+        self.edits = []
+        self.edits_size = 0
+
+    def add_edit(self, kind, offset, text):
+        if self.needs_checkpoint:
+            return
+        self.edits_size += JOURNAL_RECORD_OVERHEAD + len(text)
+        if self.edits_size > MAX_PENDING_EDITS_SIZE:
+            self.drop_edits()
+            return
+        self.edits.append((kind, offset, text))
+
 
 def start_autosave(edit_instance):
-    """start the autosave timer"""
-    timeout_id = gobject.timeout_add(1000, autosave_timeout, edit_instance)
-    edit_instance.autosave_timeout_id = timeout_id
-    edit_instance.autosave_elapsed = 0
+    """prepare autosave, the timer is only armed once a buffer changes"""
+    edit_instance.autosave_timeout_id = 0
+    edit_instance.autosave_first_change = None
+    edit_instance.autosave_last_change = None
+    edit_instance.backup_states = weakref.WeakKeyDictionary()
+
+def get_backup_state(edit_instance, buf):
+    state = edit_instance.backup_states.get(buf)
+    if state is None:
+        state = edit_instance.backup_states[buf] = BackupState()
+    return state
+
+def watch_buffer(edit_instance, buf):
+    """arm autosave whenever buf is edited"""
+    buf.add_edit_listener(functools.partial(buffer_changed, edit_instance))
 
 def stop_autosave(edit_instance):
     """stop the autosave timer and remove backup files"""
     for buf in edit_instance.buffers:
-        autosave_filename = get_autosave_filename(buf.filename)
-        if buf.has_filename() and os.path.isfile(autosave_filename):
-            os.remove(autosave_filename)
-    gobject.source_remove(edit_instance.autosave_timeout_id)
+        if not buf.has_filename() or buf.placeholder:
+            # nobody was asked yet whether to restore its backup
+            continue
+        for backup_filename in get_backup_filenames(buf.filename):
+            if os.path.isfile(backup_filename):
+                os.remove(backup_filename)
+    if edit_instance.autosave_timeout_id:
+        gobject.source_remove(edit_instance.autosave_timeout_id)
+        edit_instance.autosave_timeout_id = 0
+
+def buffer_changed(edit_instance, buf, kind, offset, text):
+    """remember when the user typed and make sure a deadline is armed"""
+    state = get_backup_state(edit_instance, buf)
+    if buf.not_undoable_action and not buf.undo_in_progress:
+        # text loaded from disk or set by pyroom, a backup adds nothing
+        state.reset(buf.generation)
+        return
+    if not edit_instance.preferences.autosave_time or \
+       not buf.has_filename() or not buf.editable:
+        # autosave never journals these edits
+        state.drop_edits()
+        return
+    state.add_edit(kind, offset, text)
+    now = time.time()
+    edit_instance.autosave_last_change = now
+    if edit_instance.autosave_first_change is None:
+        edit_instance.autosave_first_change = now
+    if not edit_instance.autosave_timeout_id:
+        arm_autosave(edit_instance, _next_deadline(edit_instance) - now)
+
+def arm_autosave(edit_instance, delay):
+    edit_instance.autosave_timeout_id = gobject.timeout_add_seconds(
+        max(1, int(math.ceil(delay))), autosave_timeout, edit_instance
+    )
+
+def _next_deadline(edit_instance):
+    """after an idle pause, but never later than the autosave time"""
+    max_delay = float(edit_instance.preferences.autosave_time) * 60
+    return min(
+        edit_instance.autosave_last_change + AUTOSAVE_IDLE_PAUSE,
+        edit_instance.autosave_first_change + max_delay
+    )
 
+@traced('autosave tick')
 def autosave_timeout(edit_instance):
-    """see if we have to autosave open files"""
-    if edit_instance.preferences.autosave_time:
-        if edit_instance.autosave_elapsed >= \
-           edit_instance.preferences.autosave_time * 60:
-            autosave(edit_instance)
-            edit_instance.autosave_elapsed = 0
-        else:
-            edit_instance.autosave_elapsed += 1
-    return True
+    """the deadline passed, back up now or wait for the user to pause"""
+    edit_instance.autosave_timeout_id = 0
+    if edit_instance.autosave_first_change is None or \
+       not edit_instance.preferences.autosave_time:
+        return False
+    now = time.time()
+    deadline = _next_deadline(edit_instance)
+    if now < deadline:
+        arm_autosave(edit_instance, deadline - now)
+        return False
+    edit_instance.autosave_first_change = None
+    edit_instance.autosave_last_change = None
+    autosave(edit_instance)
+    return False
 
 def get_autosave_filename(filename):
     """get the filename autosave would happen to"""
@@ -60,25 +170,89 @@ def get_autosave_filename(filename):
     )
     return autosave_filename
 
+def get_journal_filename(filename):
+    """get the filename edits since the last checkpoint are appended to"""
+    return get_autosave_filename(filename) + '-journal'
+
+def get_backup_filenames(filename):
+    return get_autosave_filename(filename), get_journal_filename(filename)
+
+@traced('autosave')
 def autosave(edit_instance):
-    """save all open files that have been saved before"""
+    """save all open files that have been saved before and changed since
+    their last backup"""
     for buffer in edit_instance.buffers:
-        if buffer.has_filename():
-            save_autosave_file_for_buffer(buffer)
+        if buffer.has_filename() and buffer.editable and \
+           get_backup_state(edit_instance, buffer).generation != \
+           buffer.generation:
+            save_autosave_file_for_buffer(edit_instance, buffer)
 
 
-def save_autosave_file_for_buffer(buffer):
-    backup_file = open(
-        get_autosave_filename(buffer.filename),
-        'w'
+def save_autosave_file_for_buffer(edit_instance, buffer):
+    """have the save worker append to the journal of buffer, or write a new
+    checkpoint if there is none yet or the journal got too long"""
+    state = get_backup_state(edit_instance, buffer)
+    compact_size = max(MIN_COMPACT_SIZE, len(buffer.document))
+    if state.needs_checkpoint or state.journal_size > compact_size:
+        document = buffer.document.snapshot()
+        edits = []
+        state.needs_checkpoint = False
+        state.journal_size = 0
+    else:
+        document = None
+        edits = state.edits
+        for kind, offset, text in edits:
+            state.journal_size += JOURNAL_RECORD_OVERHEAD
+            if kind == 'insert':
+                state.journal_size += len(text)
+    state.edits = []
+    state.edits_size = 0
+    state.generation = buffer.generation
+    checkpoint_filename, journal_filename = \
+        get_backup_filenames(buffer.filename)
+    edit_instance.save_worker.submit(
+        (buffer, 'autosave'),
+        JournalSave(
+            checkpoint_filename, journal_filename, document, edits,
+            functools.partial(autosave_finished, edit_instance, buffer)
+        )
     )
+
+def autosave_finished(edit_instance, buffer, job, error):
+    """report backups that could not be written"""
+    if error is not None:
+        # whatever made it to disk, the next backup starts from scratch
+        get_backup_state(edit_instance, buffer).reset(None)
+        raise PyroomError(_("Could not autosave file %s") %
+                          buffer.filename)
+
+@traced('replay journal')
+def replay_journal(edit_instance, buf):
+    """redo the edits journaled after buf's backup checkpoint was written
+
+    buf has just been filled from the checkpoint"""
+    checkpoint_filename, journal_filename = \
+        get_backup_filenames(buf.filename)
+    edits, intact = read_journal(checkpoint_filename, journal_filename)
+    buf.begin_not_undoable_action()
     try:
-        try:
-            backup_file.write(
-                buffer.get_text_from_buffer()
-            )
-        except IOError:
-            raise PyroomError(_("Could not autosave file %s") %
-                              buffer.filename)
+        for kind, first, second in edits:
+            if kind == 'delete' and second > buf.get_char_count() or \
+               first > buf.get_char_count():
+                intact = False
+                break
+            if kind == 'insert':
+                buf.insert_text(first, second)
+            else:
+                buf.delete_text(first, second)
     finally:
-        backup_file.close()
+        buf.end_not_undoable_action()
+    if edits:
+        buf.modified = True
+        buf.place_cursor_at_offset(0)
+    if intact:
+        # checkpoint and journal already hold what the buffer holds now,
+        # later edits can simply be appended
+        state = get_backup_state(edit_instance, buf)
+        state.needs_checkpoint = False
+        state.journal_size = os.path.getsize(journal_filename)
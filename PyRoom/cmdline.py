@@ -36,49 +36,154 @@ from optparse import OptionParser
 import sys
 import os
 
+import gobject
 import gtk
 
 import PyRoom
-from PyRoom.factory import Factory
-from editor import Editor
 from pyroom_error import handle_error
-from preferences import PyroomConfigFileBuilderAndReader
+from instance import InstanceServer, send_to_running_instance
+from startup_profile import StartupProfiler
+from key_trace import KeyTraceRecorder
+import latency
+from watchdog import Watchdog
+import tracing
 
 __VERSION__ = PyRoom.__VERSION__
 
-pyroom_config_file_builder_and_reader = PyroomConfigFileBuilderAndReader()
-
 def main():
     sys.excepthook = handle_error
+    profiler = StartupProfiler(PyRoom.STARTED)
+    profiler.mark('imports')
 
     files = []
 
     # Get commandline args
-    parser = OptionParser(usage = _('%prog [-v] \
+    parser = OptionParser(usage = _('%prog [-v] [-r] [--new-instance] \
+[--profile-startup FILE] [--record-keys FILE] [--measure-latency FILE] \
+[--watchdog FILE [--watchdog-threshold MS]] [--trace FILE] \
 [file1] [file2]...'),
                         version = '%prog ' + __VERSION__,
                         description = _('PyRoom lets you edit text files \
 simply and efficiently in a full-screen window, with no distractions.'))
+    parser.add_option('-r', '--read-only', action='store_true',
+                      dest='read_only', default=False,
+                      help=_('open the files in a read-only viewer'))
+    parser.add_option('--new-instance', action='store_true',
+                      dest='new_instance', default=False,
+                      help=_('start a new PyRoom even if one is running'))
+    parser.add_option('--profile-startup', dest='profile_startup',
+                      metavar='FILE',
+                      help=_('write how long each phase of starting took \
+to FILE as JSON, - for stderr'))
+    parser.add_option('--record-keys', dest='record_keys', metavar='FILE',
+                      help=_('write a trace of the editing done to FILE, \
+for replaying it later'))
+    parser.add_option('--measure-latency', dest='measure_latency',
+                      metavar='FILE',
+                      help=_('measure how long typing takes, show it with \
+Control-I and write it to FILE as JSON on exit'))
+    parser.add_option('--watchdog', dest='watchdog', metavar='FILE',
+                      help=_('append the stack of the main thread to FILE \
+whenever PyRoom stops responding for a moment'))
+    parser.add_option('--watchdog-threshold', dest='watchdog_threshold',
+                      type='int', default=50, metavar='MS',
+                      help=_('what the watchdog counts as not responding, \
+in milliseconds (default 50)'))
+    parser.add_option('--trace', dest='trace', metavar='FILE',
+                      help=_('write a timeline of the last things the \
+editor did to FILE on exit, for chrome://tracing'))
     (options, args) = parser.parse_args()
     files = args
+    if not options.profile_startup:
+        profiler = None
+
+    # the options measuring or recording something are about this process
+    diagnosing = options.profile_startup or options.record_keys or \
+        options.measure_latency or options.watchdog or options.trace
+
+    # Let a running PyRoom open the files, before paying for our own startup
+    if not options.new_instance and not diagnosing and \
+       send_to_running_instance(files, options.read_only):
+        return 0
+    if profiler:
+        profiler.mark('instance check')
+
+    if options.measure_latency:
+        latency.enable()
+    if options.trace:
+        tracing.enable()
+
+    from PyRoom.factory import Factory
+    from preferences import PyroomConfigFileBuilderAndReader
 
     # Create relevant buffers for file and load them
-    pyroom_config = pyroom_config_file_builder_and_reader.config
+    pyroom_config = PyroomConfigFileBuilderAndReader().config
+    if profiler:
+        profiler.mark('config')
     factory = Factory()
-    editor = factory.create_new_editor(pyroom_config)
+    editor = factory.create_new_editor(pyroom_config, profiler)
     buffnum = 0
 
     if len(files):
         for filename in files:
-            editor.open_file(filename)
+            editor.open_file(filename, read_only=options.read_only)
             buffnum += 1
 
     editor.set_buffer(buffnum)
+    if profiler:
+        profiler.mark('file opens')
     editor.gui.tell_user(
         _('Welcome to Pyroom %s, type Control-H for help') % __VERSION__
     )
 
-    gtk.main()
+    server = None
+    if not options.new_instance:
+        try:
+            server = InstanceServer(editor.open_files_from_other_instance)
+        except EnvironmentError:
+            # another PyRoom just started listening, or we can't; either
+            # way this one works on its own
+            pass
+
+    if profiler:
+        # idle callbacks of default priority run after the first redraw
+        gobject.idle_add(
+            first_idle, profiler, options.profile_startup
+        )
+
+    recorder = None
+    if options.record_keys:
+        recorder = KeyTraceRecorder(editor, options.record_keys)
+        recorder.start()
+    watchdog = None
+    if options.watchdog:
+        watchdog = Watchdog(
+            options.watchdog, options.watchdog_threshold / 1000.0
+        )
+        watchdog.start()
+
+    try:
+        gtk.main()
+    finally:
+        if recorder is not None:
+            recorder.stop()
+        if options.measure_latency:
+            latency.monitor.dump(options.measure_latency)
+        if watchdog is not None:
+            watchdog.stop()
+        # closing the window ends the main loop without Editor.quit, and
+        # the save thread dies with the process
+        editor.shut_down_cleanly()
+        if options.trace:
+            tracing.tracer.dump(options.trace)
+        if server is not None:
+            server.close()
+
+def first_idle(profiler, filename):
+    """the window has been drawn, startup is over"""
+    profiler.mark('first paint')
+    profiler.dump(filename, __VERSION__)
+    return False
 
 if __name__ == '__main__':
     main()
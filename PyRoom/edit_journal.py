@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+
+"""
+backups as a checkpoint plus a journal of the edits made since
+
+The checkpoint holds the complete text. The journal starts with a header
+naming the checksum and length of the checkpoint it belongs to, followed by
+one record per edit:
+
+    I <offset> <number of bytes>\\n<utf-8 text>\\n
+    D <start> <end>\\n
+
+Offsets count characters. Replaying stops at the first record that is
+incomplete, so a journal torn by a crash still gives back everything before
+the tear.
+"""
+
+import os
+import zlib
+
+from atomic_file import write_atomically
+from tracing import traced
+
+JOURNAL_MAGIC = 'PYROOM-JOURNAL 1'
+READ_SIZE = 256 * 1024
+
+
+class _Checksum(object):
+    """crc32 and length of the bytes passing through"""
+
+    def __init__(self):
+        self.crc = 0
+        self.length = 0
+
+    def track(self, chunks):
+        for chunk in chunks:
+            self.crc = zlib.crc32(chunk, self.crc)
+            self.length += len(chunk)
+            yield chunk
+
+    def header(self):
+        return '%s %d %d\n' % (
+            JOURNAL_MAGIC, self.crc & 0xffffffff, self.length
+        )
+
+
+def encode_edit(kind, offset, text):
+    """the journal record for an edit as reported to edit listeners"""
+    if kind == 'insert':
+        data = text.encode('utf-8')
+        return 'I %d %d\n%s\n' % (offset, len(data), data)
+    return 'D %d %d\n' % (offset, offset + len(text))
+
+
+class JournalSave(object):
+    """bring a checkpoint and its journal up to date
+
+    with a document snapshot the checkpoint is rewritten and the journal
+    starts over, otherwise the edits are appended to the existing journal.
+    on_finished(job, error) is called in the main loop afterwards"""
+
+    def __init__(self, checkpoint_filename, journal_filename, document,
+                 edits, on_finished=None):
+        self.checkpoint_filename = checkpoint_filename
+        self.journal_filename = journal_filename
+        self.document = document
+        self.edits = edits
+        self.on_finished = on_finished
+
+    @traced('write journal', 'save worker')
+    def run(self):
+        records = (encode_edit(*edit) for edit in self.edits)
+        if self.document is not None:
+            checksum = _Checksum()
+            write_atomically(
+                self.checkpoint_filename,
+                checksum.track(chunk.encode('utf-8')
+                               for chunk in self.document.iter_chunks())
+            )
+            write_atomically(
+                self.journal_filename,
+                _prepend(checksum.header(), records)
+            )
+            return
+        if not os.path.isfile(self.journal_filename):
+            raise IOError(2, 'journal is missing', self.journal_filename)
+        journal = open(self.journal_filename, 'ab')
+        try:
+            for record in records:
+                journal.write(record)
+            journal.flush()
+            os.fsync(journal.fileno())
+        finally:
+            journal.close()
+
+    def absorb(self, previous):
+        """the edits of a job that never ran have to be written first"""
+        if self.document is None:
+            self.document = previous.document
+            self.edits = previous.edits + self.edits
+
+    def finished(self, error):
+        if self.on_finished:
+            self.on_finished(self, error)
+        return False
+
+
+def _prepend(first, rest):
+    yield first
+    for item in rest:
+        yield item
+
+
+def read_journal(checkpoint_filename, journal_filename):
+    """the edits made after the checkpoint, as (kind, offset, text) tuples
+    for inserts and (kind, start, end) for deletes
+
+    returns the edits and whether the journal was intact, meaning it belongs
+    to the checkpoint and didn't end in a torn record; a journal belonging to
+    another checkpoint gives no edits"""
+    try:
+        journal = open(journal_filename, 'rb')
+        try:
+            data = journal.read()
+        finally:
+            journal.close()
+        checksum = _Checksum()
+        checkpoint = open(checkpoint_filename, 'rb')
+        try:
+            for chunk in checksum.track(iter(
+                lambda: checkpoint.read(READ_SIZE), ''
+            )):
+                pass
+        finally:
+            checkpoint.close()
+    except (IOError, OSError):
+        return [], False
+    header = checksum.header()
+    if not data.startswith(header):
+        return [], False
+    return _parse_records(data, len(header))
+
+
+def _parse_records(data, position):
+    edits = []
+    while position < len(data):
+        line_end = data.find('\n', position)
+        if line_end < 0:
+            return edits, False
+        fields = data[position:line_end].split(' ')
+        if len(fields) != 3 or not fields[1].isdigit() or \
+           not fields[2].isdigit():
+            return edits, False
+        kind, first, second = fields[0], int(fields[1]), int(fields[2])
+        if kind == 'I':
+            text_end = line_end + 1 + second
+            if data[text_end:text_end + 1] != '\n':
+                return edits, False
+            try:
+                text = data[line_end + 1:text_end].decode('utf-8')
+            except UnicodeDecodeError:
+                return edits, False
+            edits.append(('insert', first, text))
+            position = text_end + 1
+        elif kind == 'D' and first <= second:
+            edits.append(('delete', first, second))
+            position = line_end + 1
+        else:
+            return edits, False
+    return edits, True
@@ -19,8 +19,10 @@
 # -----------------------------------------------------------------------------
 
 
+import gobject
 import gtk
 import gtk.glade
+import functools
 import os
 import urllib
 
@@ -30,9 +32,15 @@ from preferences import Preferences
 
 from session import FileStoreSession
 from session import PrivateSession
+from session import file_fingerprint
 from undoable_buffer import UndoableBuffer
 
 import autosave
+import latency
+from file_loader import BufferLoader
+from file_viewer import MappedFile
+from save_worker import SaveWorker, SnapshotSave
+from tracing import traced
 
 FILE_UNNAMED = _('* Unnamed *')
 
@@ -42,6 +50,7 @@ _('Control-I: Show buffer information'),
 _('Control-P: Shows Preferences dialog'),
 _('Control-N: Create a new buffer'),
 _('Control-O: Open a file in a new buffer'),
+_('Control-E: Edit the selection of a read-only file in a new buffer'),
 _('Control-Q: Quit'),
 _('Control-S: Save current buffer'),
 _('Control-Shift-S: Save current buffer as'),
@@ -98,6 +107,7 @@ class Editor(object):
             self.recent_manager = None
 
         control_key_bindings = {
+            gtk.keysyms.e: self.edit_viewer_selection,
             gtk.keysyms.h: self.show_help,
             gtk.keysyms.i: self.show_info,
             gtk.keysyms.n: self.new_buffer,
@@ -114,25 +124,37 @@ class Editor(object):
         control_shift_key_bindings = {
             gtk.keysyms.s: self.save_current_buffer_as
         }
-        self.gui.bind_control_key_commands(control_key_bindings, control_shift_key_bindings)
+        self.key_commands = {
+            'control': control_key_bindings,
+            'control_shift': control_shift_key_bindings,
+        }
+        self.key_trace = None
+        self.gui.bind_control_key_commands(
+            self._key_command_runners('control'),
+            self._key_command_runners('control_shift')
+        )
+        self.gui.bind_scroll_edge_commands(
+            self.page_viewer_up, self.page_viewer_down
+        )
 
         self.UNNAMED_FILENAME = FILE_UNNAMED
 
-        self.autosave_timeout_id = ''
-        self.autosave_elapsed = ''
+        self.save_worker = SaveWorker()
+        self.shut_down = False
+        autosave.start_autosave(self)
 
+        self.prefetch_id = 0
         opened_file_list = self.session.get_open_filenames()
         for filename in opened_file_list:
-            self.open_file(filename)
+            self.add_placeholder_buffer(filename)
 
-        if not opened_file_list:
+        if opened_file_list:
+            self.set_buffer(len(self.buffers) - 1)
+        else:
             self.new_buffer()
 
         self.gui.style_textbox()
 
-        # Autosave timer object
-        autosave.start_autosave(self)
-
         self.gui.create_close_buffer_dialog_and_register_callbacks(
             self.close_buffer_save_button_handler,
             self.close_buffer_close_without_save_button_handler,
@@ -144,6 +166,18 @@ class Editor(object):
             self.quit_dialog_cancel_button
         )
 
+    def _key_command_runners(self, modifiers):
+        return dict(
+            (keyval, functools.partial(self.run_key_command, modifiers, keyval))
+            for keyval in self.key_commands[modifiers]
+        )
+
+    def run_key_command(self, modifiers, keyval):
+        """run the command bound to a control key combination"""
+        if self.key_trace is not None:
+            self.key_trace.key_command(modifiers, keyval)
+        self.key_commands[modifiers][keyval]()
+
     def show_info(self):
         """ Display buffer information on status label for 5 seconds """
 
@@ -161,8 +195,18 @@ class Editor(object):
             'char_count': buf.get_char_count(),
             'word_count': self.word_count(buf),
             'lines': buf.get_line_count(),
-            })
-
+            } + self.latency_info())
+
+    def latency_info(self):
+        """typing latencies, median/99th percentile, if they are measured"""
+        if latency.monitor is None:
+            return ''
+        summary = latency.monitor.summary()
+        if not summary:
+            return ''
+        return _(', latency %s') % summary
+
+    @traced('undo')
     def undo(self):
         """ Undo last typing """
 
@@ -172,6 +216,7 @@ class Editor(object):
         else:
             self.gui.tell_user(_('Nothing more to undo!'))
 
+    @traced('redo')
     def redo(self):
         """ Redo last typing """
 
@@ -188,13 +233,39 @@ class Editor(object):
         else:
             self.gui.tell_user(_('Closed, no files selected'))
 
+    def open_files_from_other_instance(self, filenames, read_only):
+        """open what was passed to a later invocation of pyroom"""
+        for filename in filenames:
+            self.open_file(filename, read_only=read_only)
+        self.gui.window.present()
+
     def open_file_and_add_to_session(self, filename):
         """ Open specified file in buffer and add it to our session history """
         self.session.add_open_filename(filename)
         self.open_file(filename)
 
-    def open_file(self, filename):
-        """ Open specified file """
+    @traced('open file')
+    def open_file(self, filename, read_only=False):
+        """ Open specified file
+
+        files bigger than the viewer threshold are always opened read-only"""
+        buf = self.new_buffer()
+        buf.filename = filename
+        self.load_buffer(buf, read_only)
+
+    def add_placeholder_buffer(self, filename):
+        """add a buffer for filename that is read the first time it's shown"""
+        buf = self.create_buffer()
+        buf.filename = filename
+        buf.placeholder = True
+        self.buffers.append(buf)
+        return buf
+
+    @traced('load buffer')
+    def load_buffer(self, buf, read_only=False):
+        """fill buf with the contents of the file it is named after
+
+        only the buffer being shown reports progress to the user"""
         def check_backup(filename):
             """check if restore from backup is an option
 
@@ -207,20 +278,35 @@ class Editor(object):
                     return autosave_filename
             return filename
 
-        buf = self.new_buffer()
-        buf.filename = filename
+        buf.placeholder = False
+        filename = buf.filename
+        shown = buf is self.get_current_buffer()
+        if read_only or self.is_too_big_to_edit(filename):
+            self.open_file_in_viewer(buf)
+            return
+
         filename_to_open = check_backup(filename)
+        buf.disk_fingerprint = file_fingerprint(filename)
+        if filename_to_open == filename:
+            on_finished = self.loading_finished
+            if self.load_cached_text(buf):
+                if shown:
+                    self.gui.tell_user(_('File %s open') % filename)
+                return
+        else:
+            on_finished = self.backup_restored
 
         try:
-            buffer_file = open(filename_to_open, 'r')
-            buf = self.get_current_buffer()
-            buf.begin_not_undoable_action()
-            utf8 = unicode(buffer_file.read(), 'utf-8')
-            buf.set_text(utf8)
-            buf.end_not_undoable_action()
-            buffer_file.close()
-
-
+            loader = BufferLoader(
+                buf, filename_to_open, self.gui, on_finished,
+                self.loading_failed
+            )
+            if loader.is_large:
+                loader.start()
+                if shown:
+                    self.gui.show_buffer(buf)
+                return
+            loader.run()
         except IOError, (errno, strerror):
             errortext = _('Unable to open %(filename)s.') % {
                 'filename': filename_to_open
@@ -233,51 +319,194 @@ the file.')
         except:
             raise PyroomError(_('Unable to open %s\n') % filename_to_open)
         else:
-            self.gui.tell_user(_('File %s open') % filename_to_open)
+            if shown:
+                self.gui.tell_user(_('File %s open') % filename_to_open)
+
+    def is_too_big_to_edit(self, filename):
+        threshold = int(self.config.get('editor', 'viewerthreshold'))
+        try:
+            return os.path.getsize(filename) > threshold * 1024 * 1024
+        except OSError:
+            return False
+
+    def open_file_in_viewer(self, buf):
+        """show a window of a memory mapped file in buf, read-only"""
+        try:
+            buf.viewer = MappedFile(buf.filename)
+        except EnvironmentError:
+            raise PyroomError(_('Unable to open %s\n') % buf.filename)
+        self.show_viewer_window(buf)
+        if buf is self.get_current_buffer():
+            self.gui.show_buffer(buf)
+            self.gui.tell_user(_('File %s open read-only') % buf.filename)
+
+    def show_viewer_window(self, buf, cursor_byte_offset=None):
+        """put the current window of a read-only buffer into it"""
+        buf.begin_not_undoable_action()
+        buf.set_text(buf.viewer.window_text())
+        buf.end_not_undoable_action()
+        if cursor_byte_offset is not None:
+            buf.place_cursor_at_offset(
+                buf.viewer.char_offset_of(cursor_byte_offset)
+            )
+            self.gui.scroll_to_cursor(buf)
+
+    def page_viewer_down(self):
+        """page more of a read-only file in at the bottom"""
+        buf = self.get_current_buffer()
+        if buf.is_read_only:
+            old_end = buf.viewer.page_down()
+            if old_end is not None:
+                self.show_viewer_window(buf, old_end)
+
+    def page_viewer_up(self):
+        """page more of a read-only file in at the top"""
+        buf = self.get_current_buffer()
+        if buf.is_read_only:
+            old_start = buf.viewer.page_up()
+            if old_start is not None:
+                self.show_viewer_window(buf, old_start)
+
+    def edit_viewer_selection(self):
+        """copy the selected part of a read-only file into a new buffer"""
+        viewer_buffer = self.get_current_buffer()
+        if not viewer_buffer.is_read_only:
+            self.gui.tell_user(_('Control-E only works in read-only buffers'))
+            return
+        selection = viewer_buffer.get_selection_offsets()
+        if selection is None:
+            selection = (0, viewer_buffer.get_char_count())
+        text = viewer_buffer.viewer.slice_text(*selection)
+        buf = self.new_buffer()
+        buf.begin_not_undoable_action()
+        buf.set_text(text)
+        buf.end_not_undoable_action()
+        self.gui.tell_user(
+            _('Editing a part of %s in a new buffer') % viewer_buffer.filename
+        )
+
+    def load_cached_text(self, buf):
+        """fill buf from the session's copy of its file if the file hasn't
+        changed since, returns whether that worked"""
+        fingerprint = file_fingerprint(buf.filename)
+        text = self.session.get_cached_text(buf.filename, fingerprint)
+        if text is None:
+            return False
+        buf.disk_fingerprint = fingerprint
+        buf.begin_not_undoable_action()
+        buf.set_text(text)
+        buf.end_not_undoable_action()
+        self.loading_finished(buf)
+        return True
+
+    def loading_finished(self, buf):
+        """a buffer has been filled, put the cursor back where it was last
+        time and let the user edit it if it's shown"""
+        state = self.session.get_file_state(buf.filename)
+        if state is not None:
+            buf.place_cursor_at_offset(min(state[0], buf.get_char_count()))
+        if buf is self.get_current_buffer():
+            self.gui.show_buffer(buf)
+            self.restore_scroll_position(buf)
+
+    def loading_failed(self, buf):
+        """buf has been emptied since its file couldn't be read"""
+        if buf is self.get_current_buffer():
+            self.gui.show_buffer(buf)
+
+    def backup_restored(self, buf):
+        """a backup checkpoint has been loaded, redo the journaled edits"""
+        autosave.replay_journal(self, buf)
+        buf.modified = True
+        self.loading_finished(buf)
+
+    def remember_buffer(self, buf):
+        """store cursor and scroll position of buf in the session
+
+        returns the fingerprint of the file they belong to, or None"""
+        if buf.placeholder or not buf.editable or buf.has_no_filename():
+            return None
+        fingerprint = file_fingerprint(buf.filename)
+        if fingerprint is None:
+            return None
+        if buf is self.get_current_buffer():
+            scroll = int(self.gui.get_scroll_position())
+        else:
+            state = self.session.get_file_state(buf.filename)
+            scroll = state[1] if state is not None else 0
+        self.session.set_file_state(
+            buf.filename, buf.get_cursor_offset(), scroll, fingerprint
+        )
+        return fingerprint
+
+    def restore_scroll_position(self, buf):
+        state = self.session.get_file_state(buf.filename)
+        if state is not None:
+            self.gui.set_scroll_position(state[1])
 
     def save_file_to_disk_and_session(self):
         self.save_file_to_disk()
         self.session.add_open_filename(self.get_current_buffer().filename)
 
-    def save_file_to_disk(self):
-        """ Save file """
-        try:
+    @traced('save')
+    def save_file_to_disk(self, buf=None):
+        """ Save file, the current one unless buf is given
+
+        the text is written in the background from a snapshot, so the buffer
+        counts as unmodified right away unless writing fails later on"""
+        if buf is None:
             buf = self.get_current_buffer()
-            buffer_has_filename = buf.has_filename()
-            if buffer_has_filename:
-                buffer_file = open(buf.filename, 'w')
-                txt = buf.get_text_from_buffer()
-                buffer_file.write(txt)
-                if self.recent_manager:
-                    self.recent_manager.add_full(
-                        "file://" + urllib.quote(buf.filename),
-                        {
-                            'mime_type':'text/plain',
-                            'app_name':'pyroom',
-                            'app_exec':'%F',
-                            'is_private':False,
-                            'display_name':os.path.basename(buf.filename),
-                        }
-                    )
-                buffer_file.close()
-                buf.begin_not_undoable_action()
-                buf.end_not_undoable_action()
-                self.gui.tell_user(_('File %s saved') % buf.filename)
-            else:
-                self.save_current_buffer_as()
-        except IOError, (errno, strerror):
+        if buf.is_loading:
+            self.gui.tell_user(
+                _('%s is still loading, not saved') % buf.filename
+            )
+            return
+        if buf.is_read_only:
+            self.gui.tell_user(
+                _('%s is open read-only, not saved') % buf.filename
+            )
+            return
+        if buf.has_filename():
+            self.save_worker.submit(
+                (buf, 'file'),
+                SnapshotSave(
+                    buf.filename,
+                    buf.document.snapshot(),
+                    functools.partial(self.file_saved, buf)
+                )
+            )
+            buf.modified = False
+        else:
+            self.save_current_buffer_as(buf)
+
+    def file_saved(self, buf, job, error):
+        """the save worker is done writing buf"""
+        if error is not None:
+            buf.modified = True
             errortext = _('Unable to save %(filename)s.') % {
-                'filename': buf.filename}
-            if errno == 13:
+                'filename': job.filename}
+            if getattr(error, 'errno', None) == 13:
                 errortext += _(' You do not have permission to write to \
 the file.')
             raise PyroomError(errortext)
-        except:
-            raise PyroomError(_('Unable to save %s\n') % buf.filename)
-        buf.modified = False
+        if job.filename == buf.filename:
+            buf.disk_fingerprint = file_fingerprint(job.filename)
+        if self.recent_manager:
+            self.recent_manager.add_full(
+                "file://" + urllib.quote(job.filename),
+                {
+                    'mime_type':'text/plain',
+                    'app_name':'pyroom',
+                    'app_exec':'%F',
+                    'is_private':False,
+                    'display_name':os.path.basename(job.filename),
+                }
+            )
+        self.gui.tell_user(_('File %s saved') % job.filename)
 
-    def save_current_buffer_as(self):
-        buf = self.get_current_buffer()
+    def save_current_buffer_as(self, buf=None):
+        if buf is None:
+            buf = self.get_current_buffer()
 
         if buf.has_filename():
             current_filename = buf.filename
@@ -288,22 +517,13 @@ the file.')
 
         if chosen_filename:
             buf.filename = chosen_filename
-            self.save_file_to_disk()
+            self.save_file_to_disk(buf)
         else:
             self.gui.tell_user(_('Closed, no files selected'))
 
     def word_count(self, buf):
-        """ Word count in a text buffer """
-
-        iter1 = buf.get_start_iter()
-        iter2 = iter1.copy()
-        iter2.forward_word_end()
-        count = 0
-        while iter2.get_offset() != iter1.get_offset():
-            count += 1
-            iter1 = iter2.copy()
-            iter2.forward_word_end()
-        return count
+        """ Word count in a text buffer, kept up to date while typing """
+        return buf.get_word_count()
 
     def show_help(self):
         """ Create a new buffer and inserts help """
@@ -316,12 +536,21 @@ continue editing your document.")
 
     def new_buffer(self):
         """ Create a new buffer """
-        buf = UndoableBuffer()
+        buf = self.create_buffer()
         self.buffers.insert(self.current + 1, buf)
-        buf.place_cursor(buf.get_end_iter())
+        buf.place_cursor_at_offset(buf.get_char_count())
         self.next_buffer()
         return buf
 
+    def create_buffer(self):
+        """an empty buffer, not yet one of ours"""
+        undo_budget = int(self.config.get('editor', 'undolimit')) * 1024
+        buf = UndoableBuffer(undo_budget)
+        autosave.watch_buffer(self, buf)
+        if self.key_trace is not None:
+            self.key_trace.watch_buffer(buf)
+        return buf
+
     def close_dialog(self):
         """ask for confirmation if there are unsaved contents"""
         buf = self.get_current_buffer()
@@ -342,19 +571,36 @@ continue editing your document.")
     def close_buffer_save_button_handler(self, widget, data=None):
         """save when closing"""
         self.gui.close_buffer_dialog.hide()
+        buf = self.get_current_buffer()
         self.save_file_to_disk()
+        if buf.modified or self.save_failed(buf):
+            # not saved, file_saved tells the user why; keep the buffer and
+            # its backups
+            return
         self.close_current_buffer()
 
+    def save_failed(self, buf):
+        """wait until buf is written, returns whether that failed"""
+        return (buf, 'file') in self.save_worker.wait()
+
+    @traced('close buffer')
     def close_current_buffer(self):
         """ Close current buffer """
-        autosave_fname = autosave.get_autosave_filename(
+        if self.get_current_buffer().is_loading:
+            self.get_current_buffer().loader.cancel()
+        if self.get_current_buffer().is_read_only:
+            self.get_current_buffer().viewer.close()
+        self.save_worker.discard((self.get_current_buffer(), 'autosave'))
+        # it's the user's choice now, a failed save doesn't keep us open
+        self.save_worker.forget_failure((self.get_current_buffer(), 'file'))
+        for autosave_fname in autosave.get_backup_filenames(
             self.get_current_buffer().filename
-        )
-        if os.path.isfile(autosave_fname):
-            try:
-                os.remove(autosave_fname)
-            except OSError:
-                raise PyroomError(_('Could not delete autosave file.'))
+        ):
+            if os.path.isfile(autosave_fname):
+                try:
+                    os.remove(autosave_fname)
+                except OSError:
+                    raise PyroomError(_('Could not delete autosave file.'))
         if len(self.buffers) > 1:
             self.session.remove_open_filename(
                 self.get_current_buffer().filename
@@ -363,36 +609,69 @@ continue editing your document.")
             self.current = min(len(self.buffers) - 1, self.current)
             self.set_buffer(self.current)
         else:
-            quit()
+            self.quit()
 
+    @traced('switch buffer')
     def set_buffer(self, index):
         """ Set current buffer """
         if index >= 0 and index < len(self.buffers):
+            if index != self.current:
+                self.remember_buffer(self.get_current_buffer())
             self.current = index
             buf = self.get_current_buffer()
-            self.gui.show_text_buffer(buf.text_buffer)
+            if buf.placeholder:
+                self.load_buffer(buf)
+            self.gui.show_buffer(buf)
             self.gui.show_changed_buffer_status(self.current + 1, buf.filename)
+            if not self.prefetch_id:
+                self.prefetch_id = gobject.idle_add(
+                    self.prefetch_neighbours, priority=gobject.PRIORITY_LOW
+                )
+
+    @traced('prefetch buffers')
+    def prefetch_neighbours(self):
+        """read the buffers next to the current one before they're shown
+
+        one buffer per call; buffers with a backup wait until they're shown,
+        so the user is asked about restoring it when it makes sense"""
+        count = len(self.buffers)
+        for index in (self.current + 1, self.current - 1):
+            if not count:
+                break
+            buf = self.buffers[index % count]
+            if buf.placeholder and not self.has_autosave_backup(
+                autosave.get_autosave_filename(buf.filename)
+            ):
+                try:
+                    self.load_buffer(buf)
+                except PyroomError:
+                    pass
+                return True
+        self.prefetch_id = 0
+        return False
 
 
     def next_buffer(self):
         """ Switch to next buffer """
 
         if self.current < len(self.buffers) - 1:
-            self.current += 1
+            index = self.current + 1
         else:
-            self.current = 0
-        self.set_buffer(self.current)
-        self.gui.place_cursor_at_start_of_buffer(self.get_current_buffer().get_insert())
+            index = 0
+        self.set_buffer(index)
+        self.gui.scroll_to_cursor(self.get_current_buffer())
+        self.restore_scroll_position(self.get_current_buffer())
 
     def prev_buffer(self):
         """ Switch to prev buffer """
 
         if self.current > 0:
-            self.current -= 1
+            index = self.current - 1
         else:
-            self.current = len(self.buffers) - 1
-        self.set_buffer(self.current)
-        self.gui.place_cursor_at_start_of_buffer(self.get_current_buffer().get_insert())
+            index = len(self.buffers) - 1
+        self.set_buffer(index)
+        self.gui.scroll_to_cursor(self.get_current_buffer())
+        self.restore_scroll_position(self.get_current_buffer())
 
     def save_dialog_or_quit_editor(self):
         count = self.count_modified_buffers()
@@ -422,9 +701,9 @@ continue editing your document.")
 
     def ask_for_filename_and_save_buffer(self, buf):
         if buf.filename == FILE_UNNAMED:
-            self.save_current_buffer_as()
+            self.save_current_buffer_as(buf)
         else:
-            self.save_file_to_disk()
+            self.save_file_to_disk(buf)
 
     def quit_dialog_close_button_handler(self, widget, data=None):
         """really quit"""
@@ -432,7 +711,7 @@ continue editing your document.")
         self.quit_editor()
 
     def quit_editor(self):
-        self.quit()
+        self.quit(discard_unsaved=True)
 
     def hide_quit_dialog(self):
         self.gui.quitdialog.hide()
@@ -440,11 +719,49 @@ continue editing your document.")
     def show_quit_dialog(self):
         self.gui.quitdialog.show()
 
-    def quit(self):
-        """cleanup before quitting"""
-        autosave.stop_autosave(self)
+    @traced('quit')
+    def quit(self, discard_unsaved=False):
+        """cleanup before quitting
+
+        doesn't quit if a buffer couldn't be saved, its backups are kept,
+        unless the user chose to discard unsaved changes"""
+        failed = [
+            job.filename
+            for (buf, kind), (job, error) in self.save_worker.wait().items()
+            if kind == 'file' and buf in self.buffers
+        ]
+        if failed and not discard_unsaved:
+            self.gui.tell_user(
+                _('Not quitting, could not save %s') % ', '.join(failed)
+            )
+            return
+        self.shut_down_cleanly()
         self.gui.quit()
 
+    def shut_down_cleanly(self):
+        """finish saving and store the session
+
+        also called when the main loop ends without quit(), like when the
+        window is closed; only does anything the first time"""
+        if self.shut_down:
+            return
+        self.shut_down = True
+        self.save_worker.stop()
+        for buf in self.buffers:
+            fingerprint = self.remember_buffer(buf)
+            # a file changed by someone else keeps its new text
+            if fingerprint is not None and not buf.modified and \
+               fingerprint == buf.disk_fingerprint:
+                try:
+                    self.session.cache_text(
+                        buf.filename, fingerprint, buf.document.snapshot()
+                    )
+                except EnvironmentError:
+                    # only a cache, the file itself is read next time
+                    pass
+        autosave.stop_autosave(self)
+        self.session.flush()
+
     def get_current_buffer(self):
         """
         :rtype : UndoableBuffer
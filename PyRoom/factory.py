@@ -11,16 +11,35 @@ from PyRoom.gui import MockPreferences
 
 class Factory(object):
 
-    def create_new_editor(self, pyroom_config):
+    def create_new_editor(self, pyroom_config, profiler=None):
+        """profiler, a StartupProfiler, is told when each part is done"""
         gui = self.create_gui(pyroom_config)
+        if profiler:
+            profiler.mark('gui')
         session = self.create_new_session(pyroom_config)
+        if profiler:
+            profiler.mark('session')
         preferences = self.create_new_preferences(pyroom_config, gui)
-        return Editor(
+        if profiler:
+            profiler.mark('preferences')
+        editor = Editor(
             pyroom_config=pyroom_config,
             gui=gui,
             session=session,
             preferences=preferences
         )
+        if profiler:
+            profiler.mark('editor')
+        return editor
+
+    def create_new_headless_editor(self, pyroom_config):
+        """an editor that never touches the display"""
+        return Editor(
+            pyroom_config=pyroom_config,
+            gui=MockGUI(),
+            session=self.create_new_session(pyroom_config),
+            preferences=MockPreferences()
+        )
 
     def create_new_session(self, pyroom_config):
         if pyroom_config.get('session', 'private') == '1':
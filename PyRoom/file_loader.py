@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+
+"""
+load files into buffers a chunk at a time
+
+Large files are read, decoded and inserted from idle callbacks so the window
+stays responsive, and only the decoded text ends up in memory.
+"""
+
+import codecs
+import os
+
+import gobject
+
+from pyroom_error import PyroomError
+from undoable_buffer import FILE_UNNAMED
+
+CHUNK_SIZE = 256 * 1024
+# smaller files are loaded right away, without going through the main loop
+STREAMING_THRESHOLD = 1024 * 1024
+
+
+class BufferLoader(object):
+    """fills an UndoableBuffer with the contents of a file
+
+    while loading the buffer is marked non-undoable and stays unmodified,
+    and has no view so the text isn't kept twice; opening the file happens
+    in the constructor so IOErrors reach the caller right away"""
+
+    def __init__(self, buf, filename, gui, on_finished=None, on_failed=None):
+        self.buf = buf
+        self.filename = filename
+        self.gui = gui
+        self.on_finished = on_finished
+        self.on_failed = on_failed
+        self.source_file = open(filename, 'rb')
+        self.total_size = os.fstat(self.source_file.fileno()).st_size
+        self.bytes_read = 0
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.idle_id = 0
+        self.reported_percentage = -1
+        self.buf.loader = self
+        self.buf.begin_not_undoable_action()
+        self.buf.detach_view()
+
+    @property
+    def is_large(self):
+        return self.total_size > STREAMING_THRESHOLD
+
+    def run(self):
+        """load everything right now"""
+        try:
+            while self.load_chunk():
+                pass
+        except (IOError, UnicodeDecodeError):
+            self._fail()
+            raise
+
+    def start(self):
+        """load from idle callbacks, one chunk per main loop iteration"""
+        self.idle_id = gobject.idle_add(self._idle_load)
+
+    def cancel(self):
+        """stop loading, the buffer keeps what has been read so far"""
+        if self.idle_id:
+            gobject.source_remove(self.idle_id)
+            self.idle_id = 0
+        self._close()
+        self.gui.tell_user(_('Stopped loading %s') % self.filename)
+
+    def load_chunk(self):
+        """read, decode and append one chunk
+
+        returns True while there is more to load"""
+        data = self.source_file.read(CHUNK_SIZE)
+        self.bytes_read += len(data)
+        text = self.decoder.decode(data, not data)
+        if text:
+            self.buf.insert_text(self.buf.get_char_count(), text)
+        if data:
+            return True
+        self._close()
+        self.buf.place_cursor_at_offset(0)
+        if self.on_finished:
+            self.on_finished(self.buf)
+        return False
+
+    def _idle_load(self):
+        try:
+            more_to_load = self.load_chunk()
+        except (IOError, UnicodeDecodeError):
+            self.idle_id = 0
+            self._fail()
+            raise PyroomError(_('Unable to open %s\n') % self.filename)
+        if not more_to_load:
+            self.idle_id = 0
+            self.gui.tell_user(_('File %s open') % self.filename)
+            return False
+        self._report_progress()
+        return True
+
+    def _report_progress(self):
+        percentage = 100 * self.bytes_read / max(self.total_size, 1)
+        if percentage != self.reported_percentage:
+            self.reported_percentage = percentage
+            self.gui.tell_user(
+                _('Loading %(filename)s: %(percentage)d%% \
+(Control-W to cancel)') % {
+                    'filename': self.filename,
+                    'percentage': percentage,
+                }
+            )
+
+    def _fail(self):
+        """the file couldn't be read to the end, empty the buffer and drop
+        its filename so saving can't cut the file short"""
+        self._close()
+        self.buf.filename = FILE_UNNAMED
+        self.buf.begin_not_undoable_action()
+        self.buf.delete_text(0, self.buf.get_char_count())
+        self.buf.end_not_undoable_action()
+        self.buf.modified = False
+        if self.on_failed:
+            self.on_failed(self.buf)
+
+    def _close(self):
+        self.source_file.close()
+        self.buf.end_not_undoable_action()
+        self.buf.loader = None
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+
+"""
+read-only window onto files too big to load
+
+The file is memory mapped and only a window of lines around what the user
+is looking at gets decoded and put into the buffer. Paging moves the window
+by scanning for newlines next to it, so neither startup time nor memory
+depend on the size of the file.
+"""
+
+import mmap
+import os
+
+WINDOW_LINES = 400
+PAGE_LINES = 100
+# never decode more than this per window, even for files without newlines
+MAX_WINDOW_BYTES = 1024 * 1024
+
+
+class MappedFile(object):
+    """a window of lines of a memory mapped file"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        source_file = open(filename, 'rb')
+        try:
+            self.size = os.fstat(source_file.fileno()).st_size
+            if self.size:
+                self.data = mmap.mmap(
+                    source_file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            else:
+                self.data = ''
+        finally:
+            source_file.close()
+        self.window_start = 0
+        self.window_end = self._forward_lines(0, WINDOW_LINES)
+
+    def window_text(self):
+        """the decoded text currently shown"""
+        return self.data[self.window_start:self.window_end].decode(
+            'utf-8', 'replace'
+        )
+
+    def char_offset_of(self, byte_offset):
+        """character offset inside the window of a byte offset in the file"""
+        return len(self.data[self.window_start:byte_offset].decode(
+            'utf-8', 'replace'
+        ))
+
+    def slice_text(self, start, end):
+        """text between two character offsets of the window"""
+        return self.window_text()[start:end]
+
+    def page_down(self):
+        """move the window PAGE_LINES forward
+
+        returns the byte offset of the old window end, or None at the end"""
+        if self.window_end >= self.size:
+            return None
+        old_end = self.window_end
+        self.window_end = self._forward_lines(self.window_end, PAGE_LINES)
+        self.window_start = self._forward_lines(self.window_start, PAGE_LINES)
+        return old_end
+
+    def page_up(self):
+        """move the window PAGE_LINES back
+
+        returns the byte offset of the old window start, or None at the top"""
+        if self.window_start <= 0:
+            return None
+        old_start = self.window_start
+        self.window_start = self._backward_lines(
+            self.window_start, PAGE_LINES
+        )
+        self.window_end = self._forward_lines(self.window_start, WINDOW_LINES)
+        return old_start
+
+    def close(self):
+        if self.size:
+            self.data.close()
+
+    def _forward_lines(self, position, count):
+        """byte offset count lines after position"""
+        limit = min(self.size, position + MAX_WINDOW_BYTES)
+        for line in xrange(count):
+            if position >= limit:
+                return self._char_boundary(limit)
+            newline = self.data.find('\n', position, limit)
+            if newline == -1:
+                return self._char_boundary(limit)
+            position = newline + 1
+        return position
+
+    def _backward_lines(self, position, count):
+        """byte offset of the start of the line count lines before position"""
+        limit = max(0, position - MAX_WINDOW_BYTES)
+        for line in xrange(count):
+            if position <= limit:
+                return self._char_boundary(limit)
+            newline = self.data.rfind('\n', limit, position - 1)
+            if newline == -1:
+                return self._char_boundary(limit)
+            position = newline + 1
+        return position
+
+    def _char_boundary(self, position):
+        """step back to the start of an utf-8 sequence"""
+        while 0 < position < self.size and \
+                0x80 <= ord(self.data[position]) < 0xc0:
+            position -= 1
+        return position
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+
+"""
+build widgets from a glade file that is read only once
+
+gtk.glade.XML parses the whole file every time, even when it only builds one
+dialog. We split the file into one small definition per toplevel widget the
+first time it is needed, and hand libglade just that part.
+"""
+
+from xml.etree import ElementTree
+
+import gtk.glade
+
+_definitions = {}
+
+
+def load_widget_tree(filename, root):
+    """a gtk.glade.XML holding the toplevel widget root of filename"""
+    if filename not in _definitions:
+        _definitions[filename] = _split_toplevel_widgets(filename)
+    definition = _definitions[filename][root]
+    return gtk.glade.xml_new_from_buffer(definition, len(definition), root)
+
+
+def _split_toplevel_widgets(filename):
+    interface = ElementTree.parse(filename).getroot()
+    definitions = {}
+    for widget in interface.findall('widget'):
+        definitions[widget.get('id')] = ''.join([
+            '<?xml version="1.0"?>\n',
+            '<!DOCTYPE glade-interface SYSTEM "glade-2.0.dtd">\n',
+            '<glade-interface>',
+            ElementTree.tostring(widget),
+            '</glade-interface>\n',
+        ])
+    return definitions
@@ -39,35 +39,99 @@ else:
     from xdg.BaseDirectory import xdg_data_home as data_home
 
 from pyroom_error import PyroomError
+from glade_loader import load_widget_tree
+import latency
+from tracing import traced
+
+
+class ThemeCatalog(object):
+    """every theme file we know of, parsed at most once per change
+
+    theme directories are listed on first use and then only looked at again
+    by refresh(), which rescans directories whose mtime changed and forgets
+    parsed themes whose file changed"""
+
+    def __init__(self, directories):
+        self.directories = directories
+        self.directory_mtimes = None
+        self.filenames = {}
+        self.names = []
+        # filename -> (mtime, theme items)
+        self.parsed = {}
+
+    def refresh(self):
+        mtimes = [_mtime(directory) for directory in self.directories]
+        if mtimes != self.directory_mtimes:
+            self.directory_mtimes = mtimes
+            self._index()
+        for filename, (mtime, items) in self.parsed.items():
+            if _mtime(filename) != mtime:
+                del self.parsed[filename]
+
+    def theme_names(self):
+        """names of all themes but the custom one, in order of preference"""
+        if self.directory_mtimes is None:
+            self.refresh()
+        return list(self.names)
+
+    def get_items(self, theme_name):
+        """the settings of a theme as (key, value) pairs"""
+        if self.directory_mtimes is None:
+            self.refresh()
+        theme_filename = self.filenames.get(theme_name)
+        if theme_filename is None:
+            # maybe it has just been saved
+            self.refresh()
+            theme_filename = self.filenames.get(theme_name)
+        if theme_filename is None:
+            raise PyroomError(_('theme not found: %s') % theme_name)
+        if theme_filename not in self.parsed:
+            theme_file = ConfigParser.SafeConfigParser()
+            theme_file.read(theme_filename)
+            self.parsed[theme_filename] = (
+                _mtime(theme_filename), theme_file.items('theme')
+            )
+        return self.parsed[theme_filename][1]
+
+    def _index(self):
+        """order of preference is homedir, global dir, source dir"""
+        self.filenames = {}
+        self.names = []
+        for directory in self.directories:
+            try:
+                entries = os.listdir(directory)
+            except OSError:
+                continue
+            for entry in entries:
+                if not entry.endswith('.theme'):
+                    continue
+                theme_name = entry[:-len('.theme')]
+                if theme_name in self.filenames:
+                    continue
+                self.filenames[theme_name] = os.path.join(directory, entry)
+                if theme_name != 'custom':
+                    self.names.append(theme_name)
+
+
+def _mtime(filename):
+    try:
+        return os.stat(filename).st_mtime
+    except OSError:
+        return None
+
+
+theme_catalog = ThemeCatalog((
+    os.path.join(data_home, 'pyroom', 'themes'),
+    '/usr/share/pyroom/themes',  # FIXME: platform
+    # in case PyRoom is run without installation
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'themes'),
+))
 
 
 class Theme(dict):
     """basically a dict with some utility methods"""
     def __init__(self, theme_name):
-        theme_filename = self._lookup_theme(theme_name)
-        if not theme_filename:
-            raise PyroomError(_('theme not found: %s') % theme_name)
-        theme_file = ConfigParser.SafeConfigParser()
-        theme_file.read(theme_filename)
-        self.update(theme_file.items('theme'))
-
-    def _lookup_theme(self, theme_name):
-        """lookup theme_filename for given theme_name
-        order of preference is homedir, global dir, source dir
-        (if available)"""
-
-        local_directory = os.path.join(data_home, 'pyroom', 'themes')
-        global_directory = '/usr/share/pyroom/themes'  # FIXME: platform
-        # in case PyRoom is run without installation
-        fallback_directory = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)),
-            '..',
-            'themes'
-        )
-        for dirname in (local_directory, global_directory, fallback_directory):
-            filename = os.path.join(dirname, theme_name + '.theme')
-            if os.path.isfile(filename):
-                return filename
+        self.update(theme_catalog.get_items(theme_name))
 
     def save(self, filename):
         """save a theme"""
@@ -77,24 +141,60 @@ class Theme(dict):
             theme_file.set('theme', key, str(value))
         theme_file.set('theme', 'name', os.path.basename(filename))
         theme_file.write(open(filename + '.theme', 'w'))
+        theme_catalog.refresh()
 
 
 class FadeLabel(gtk.Label):
-    """ GTK Label with timed fade out effect """
+    """ GTK Label with timed fade out effect
+
+    the colors of the fade are computed once per theme; there are only as
+    many steps as the eye can tell apart, and a label that isn't on screen
+    skips right to the end"""
 
     active_duration = 3000  # Fade start after this time
     fade_duration = 1500.0  # Fade duration
+    max_fade_steps = 32
 
     def __init__(self, message='', active_color=None, inactive_color=None):
         gtk.Label.__init__(self, message)
         if not active_color:
             active_color = '#ffffff'
-        self.active_color = active_color
         if not inactive_color:
             inactive_color = '#000000'
-        self.fade_level = 0
-        self.inactive_color = inactive_color
         self.idle = 0
+        self.fade_position = 0
+        self.shown_color = None
+        self.set_colors(active_color, inactive_color)
+
+    def set_colors(self, active_color, inactive_color):
+        """fade from active_color to inactive_color"""
+        self.active_color = active_color
+        self.inactive_color = inactive_color
+        active = gtk.gdk.color_parse(active_color)
+        inactive = gtk.gdk.color_parse(inactive_color)
+        channels = zip(
+            (inactive.red, inactive.green, inactive.blue),
+            (active.red, active.green, active.blue)
+        )
+        # one step per 8 bit level of the channel changing most
+        distance = max(abs(end - start) for end, start in channels) >> 8
+        steps = max(1, min(self.max_fade_steps, distance))
+        self.fade_interval = int(self.fade_duration / steps)
+        self.fade_ramp = [
+            tuple(end + (start - end) * step / steps
+                  for end, start in channels)
+            for step in range(steps - 1, -1, -1)
+        ]
+        self.active_rgb = (active.red, active.green, active.blue)
+        self.shown_color = None
+        # a fade under way goes on along the new ramp
+        self.fade_position = min(self.fade_position, len(self.fade_ramp) - 1)
+
+    def show_color(self, rgb):
+        """restyling is expensive, only do it if the color changes"""
+        if rgb != self.shown_color:
+            self.shown_color = rgb
+            self.modify_fg(gtk.STATE_NORMAL, gtk.gdk.Color(*rgb))
 
     def set_text(self, message, duration=None):
         """change text that is displayed
@@ -102,8 +202,7 @@ class FadeLabel(gtk.Label):
         @param duration: duration in miliseconds"""
         if not duration:
             duration = self.active_duration
-        self.modify_fg(gtk.STATE_NORMAL,
-                       gtk.gdk.color_parse(self.active_color))
+        self.show_color(self.active_rgb)
         gtk.Label.set_text(self, message)
         if self.idle:
             gobject.source_remove(self.idle)
@@ -111,23 +210,17 @@ class FadeLabel(gtk.Label):
 
     def fade_start(self):
         """start fading timer"""
-        self.fade_level = 1.0
-        if self.idle:
-            gobject.source_remove(self.idle)
-        self.idle = gobject.timeout_add(25, self.fade_out)
+        self.fade_position = 0
+        self.idle = gobject.timeout_add(self.fade_interval, self.fade_out)
+        return False
 
     def fade_out(self):
         """now fade out"""
-        color = gtk.gdk.color_parse(self.inactive_color)
-        (red1, green1, blue1) = (color.red, color.green, color.blue)
-        color = gtk.gdk.color_parse(self.active_color)
-        (red2, green2, blue2) = (color.red, color.green, color.blue)
-        red = red1 + int(self.fade_level * (red2 - red1))
-        green = green1 + int(self.fade_level * (green2 - green1))
-        blue = blue1 + int(self.fade_level * (blue2 - blue1))
-        self.modify_fg(gtk.STATE_NORMAL, gtk.gdk.Color(red, green, blue))
-        self.fade_level -= 1.0 / (self.fade_duration / 25)
-        if self.fade_level > 0:
+        if not self.get_mapped():
+            self.fade_position = len(self.fade_ramp) - 1
+        self.show_color(self.fade_ramp[self.fade_position])
+        self.fade_position += 1
+        if self.fade_position < len(self.fade_ramp):
             return True
         self.idle = 0
         return False
@@ -164,6 +257,22 @@ class AbstractGUI(object):
     def show_text_buffer(self, text_buffer):
         pass
 
+    @abstractmethod
+    def show_buffer(self, buf):
+        pass
+
+    @abstractmethod
+    def scroll_to_cursor(self, buf):
+        pass
+
+    @abstractmethod
+    def get_scroll_position(self):
+        pass
+
+    @abstractmethod
+    def set_scroll_position(self, position):
+        pass
+
     @abstractmethod
     def show_changed_buffer_status(self, buffer_id, buffer_filename):
         pass
@@ -184,6 +293,10 @@ class GUI(AbstractGUI):
         self.theme = Theme(theme_name)
 
         self.status = FadeLabel()
+        self._quitdialog = None
+        self._close_buffer_dialog = None
+        self.scrolled_past_top = None
+        self.scrolled_past_bottom = None
 
         # Main window
 
@@ -195,6 +308,14 @@ class GUI(AbstractGUI):
         self.textbox = gtk.TextView()
         self.textbox.connect('scroll-event', self.scroll_event)
         self.textbox.set_wrap_mode(gtk.WRAP_WORD)
+        # shown instead of buffers that are still loading
+        self.loading_text_buffer = gtk.TextBuffer()
+        if latency.monitor is not None:
+            self.textbox.connect('key-press-event', latency.monitor.key_pressed)
+            self.textbox.connect(
+                'key-release-event', latency.monitor.key_released
+            )
+            self.textbox.connect_after('expose-event', latency.monitor.exposed)
 
         self.fixed = gtk.Fixed()
         self.vbox = gtk.VBox()
@@ -227,18 +348,67 @@ class GUI(AbstractGUI):
         self.status.set_justify(gtk.JUSTIFY_LEFT)
 
 
+        self.theme_idle = 0
+        self.applied_theme = {}
+        self.monitor_geometry = None
+        gtk.gdk.screen_get_default().connect(
+            'monitors-changed', self.monitors_changed
+        )
         self._adjust_window_if_multiple_monitors()
-        self.apply_theme()
+        self.apply_theme_now()
 
         self.window.show_all()
         self.window.fullscreen()
 
     def apply_theme(self):
-        """immediately apply the theme given in configuration
+        """apply the theme given in configuration once gtk is idle
 
         this has changed from previous versions! Takes no arguments!
-        Only uses configuration!"""
-        
+        Only uses configuration! Changes made in a row, like the steps of
+        a spin button, are applied together."""
+        if not self.theme_idle:
+            self.theme_idle = gobject.idle_add(self._idle_apply_theme)
+
+    def _idle_apply_theme(self):
+        self.theme_idle = 0
+        self.apply_theme_now()
+        return False
+
+    @traced('apply theme')
+    def apply_theme_now(self):
+        """apply the parts of the theme that changed since last time"""
+        if self.theme_idle:
+            gobject.source_remove(self.theme_idle)
+            self.theme_idle = 0
+        if self.config.get('visual', 'indent') == '1':
+            pango_context = self.textbox.get_pango_context()
+            current_font_size = pango_context.\
+                    get_font_description().\
+                    get_size() / 1024
+            indent = current_font_size * 2
+        else:
+            indent = 0
+        wanted = [
+            ('foreground', self.theme['foreground'], self._apply_foreground),
+            ('background', self.theme['background'], self._apply_background),
+            ('textboxbg', self.theme['textboxbg'], self._apply_textboxbg),
+            ('border', self.theme['border'], self._apply_border_color),
+            ('padding', int(self.theme['padding']),
+             self.textbox.set_border_width),
+            ('size', (float(self.theme['width']),
+                      float(self.theme['height']),
+                      self.monitor_geometry.width,
+                      self.monitor_geometry.height), self._apply_size),
+            ('showborder', int(self.config.get('visual', 'showborder')),
+             self._apply_showborder),
+            ('indent', indent, self.textbox.set_indent),
+        ]
+        for key, value, apply_value in wanted:
+            if self.applied_theme.get(key) != value:
+                apply_value(value)
+                self.applied_theme[key] = value
+
+    def _apply_foreground(self, color):
         # text cursor
         gtkrc_string = """\
         style "pyroom-colored-cursor" {
@@ -246,25 +416,34 @@ class GUI(AbstractGUI):
         bg_pixmap[NORMAL] = "<none>"
         }
         class "GtkWidget" style "pyroom-colored-cursor"
-        """ % self.theme['foreground']
+        """ % color
         gtk.rc_parse_string(gtkrc_string)
+        color = gtk.gdk.color_parse(color)
+        self.textbox.modify_base(gtk.STATE_SELECTED, color)
+        self.textbox.modify_text(gtk.STATE_NORMAL, color)
+        self.textbox.modify_fg(gtk.STATE_NORMAL, color)
+        self.status.set_colors(
+            self.theme['foreground'], self.theme['background']
+        )
 
-        padding = int(self.theme['padding'])
-        self.textbox.set_border_width(padding)
-        
-        # Screen geometry
-        screen = gtk.gdk.screen_get_default()
-        root_window = screen.get_root_window()
-        mouse_x, mouse_y, mouse_mods = root_window.get_pointer()
-        current_monitor_number = screen.get_monitor_at_point(mouse_x, mouse_y)
-        monitor_geometry = screen.get_monitor_geometry(current_monitor_number)
-        (screen_width, screen_height) = (monitor_geometry.width,
-                                         monitor_geometry.height)
+    def _apply_background(self, color):
+        self.window.modify_bg(gtk.STATE_NORMAL, gtk.gdk.color_parse(color))
+        self.status.set_colors(
+            self.theme['foreground'], self.theme['background']
+        )
+
+    def _apply_textboxbg(self, color):
+        color = gtk.gdk.color_parse(color)
+        self.textbox.modify_bg(gtk.STATE_NORMAL, color)
+        self.textbox.modify_base(gtk.STATE_NORMAL, color)
+        self.textbox.modify_text(gtk.STATE_SELECTED, color)
+
+    def _apply_border_color(self, color):
+        self.boxout.modify_bg(gtk.STATE_NORMAL, gtk.gdk.color_parse(color))
 
-        width_percentage = float(self.theme['width'])
-        height_percentage = float(self.theme['height'])
-        
-        # Sizing
+    def _apply_size(self, size):
+        (width_percentage, height_percentage,
+         screen_width, screen_height) = size
         self.vbox.set_size_request(
             int(width_percentage * screen_width),
             int(height_percentage * screen_height)
@@ -274,36 +453,15 @@ class GUI(AbstractGUI):
                         int(((1 - height_percentage) * screen_height) / 2)
         )
 
-        parse_color = lambda x: gtk.gdk.color_parse(self.theme[x])
-        # Colors
-        self.window.modify_bg(gtk.STATE_NORMAL, parse_color('background'))
-        self.boxout.modify_bg(gtk.STATE_NORMAL, parse_color('border'))
-        self.status.active_color = self.theme['foreground']
-        self.status.inactive_color = self.theme['background']
-        self.textbox.modify_bg(gtk.STATE_NORMAL, parse_color('textboxbg'))
-        self.textbox.modify_base(gtk.STATE_NORMAL, parse_color('textboxbg'))
-        self.textbox.modify_base(gtk.STATE_SELECTED, parse_color('foreground'))
-        self.textbox.modify_text(gtk.STATE_NORMAL, parse_color('foreground'))
-        self.textbox.modify_text(gtk.STATE_SELECTED, parse_color('textboxbg'))
-        self.textbox.modify_fg(gtk.STATE_NORMAL, parse_color('foreground'))
-
-        # Border
-        if not int(self.config.get('visual', 'showborder')):
-            self.boxin.set_border_width(0)
-            self.boxout.set_border_width(0)
-        else:
-            self.boxin.set_border_width(1)
-            self.boxout.set_border_width(1)
+    def _apply_showborder(self, showborder):
+        border_width = showborder and 1 or 0
+        self.boxin.set_border_width(border_width)
+        self.boxout.set_border_width(border_width)
 
-        # Indent
-        if self.config.get('visual', 'indent') == '1':
-            pango_context = self.textbox.get_pango_context()
-            current_font_size = pango_context.\
-                    get_font_description().\
-                    get_size() / 1024
-            self.textbox.set_indent(current_font_size * 2)
-        else:
-            self.textbox.set_indent(0)
+    def monitors_changed(self, screen):
+        """a monitor was added, removed or resized"""
+        self._adjust_window_if_multiple_monitors()
+        self.apply_theme()
 
     def quit(self):
         """ quit pyroom """
@@ -325,6 +483,9 @@ class GUI(AbstractGUI):
         """ Scroll window down """
 
         adj = self.scrolled.get_vadjustment()
+        if adj.value >= adj.upper - adj.page_size and \
+           self.scrolled_past_bottom:
+            self.scrolled_past_bottom()
         if adj.upper > adj.page_size:
             adj.value = min(adj.upper - adj.page_size, adj.value
                             + adj.step_increment)
@@ -333,11 +494,18 @@ class GUI(AbstractGUI):
         """ Scroll window up """
 
         adj = self.scrolled.get_vadjustment()
+        if adj.value <= 0 and self.scrolled_past_top:
+            self.scrolled_past_top()
         if adj.value > adj.step_increment:
             adj.value -= adj.step_increment
         else:
             adj.value = 0
 
+    def bind_scroll_edge_commands(self, top_callback, bottom_callback):
+        """call these when the user scrolls beyond the top or bottom"""
+        self.scrolled_past_top = top_callback
+        self.scrolled_past_bottom = bottom_callback
+
     def style_textbox(self):
         self.textbox.set_pixels_below_lines(
             int(self.config.get("visual", "linespacing"))
@@ -352,6 +520,31 @@ class GUI(AbstractGUI):
     def show_text_buffer(self, text_buffer):
         self.textbox.set_buffer(text_buffer)
 
+    def show_buffer(self, buf):
+        if buf.is_loading:
+            # the text is shown once it's all there
+            self.show_text_buffer(self.loading_text_buffer)
+            self.textbox.set_editable(False)
+            return
+        self.show_text_buffer(buf.text_buffer)
+        self.textbox.set_editable(buf.editable)
+
+    def scroll_to_cursor(self, buf):
+        if buf.is_loading:
+            return
+        self.place_cursor_at_start_of_buffer(buf.get_insert())
+
+    def get_scroll_position(self):
+        return self.scrolled.get_vadjustment().value
+
+    def set_scroll_position(self, position):
+        """scroll there once the text view has laid out its text"""
+        def scroll():
+            adj = self.scrolled.get_vadjustment()
+            adj.value = max(0, min(position, adj.upper - adj.page_size))
+            return False
+        gobject.idle_add(scroll, priority=gobject.PRIORITY_LOW)
+
     def tell_user(self, message):
         self.status.set_text(message, 500)
 
@@ -376,18 +569,12 @@ class GUI(AbstractGUI):
             cancel_button_callback
     ):
 
-        self.aTree = gtk.glade.XML(
-            os.path.join(self.config.pyroom_absolute_path, "interface.glade"),
-            "QuitSave"
-        )
-        self.quitdialog = self.aTree.get_widget("QuitSave")
-        self.quitdialog.set_transient_for(self.window)
-        dic = {
+        """the dialog itself is built the first time it's used"""
+        self.quit_dialog_handlers = {
             "on_button-save2_clicked": save_button_callback,
             "on_button-close2_clicked": close_button_callback,
             "on_button-cancel2_clicked": cancel_button_callback,
         }
-        self.aTree.signal_autoconnect(dic)
 
     def create_close_buffer_dialog_and_register_callbacks(
             self,
@@ -395,17 +582,38 @@ class GUI(AbstractGUI):
             no_callback,
             cancel_callback
     ):
-        self.wTree = gtk.glade.XML(
-            os.path.join(self.config.pyroom_absolute_path, "interface.glade"),
-            "SaveBuffer")
-        self.close_buffer_dialog = self.wTree.get_widget("SaveBuffer")
-        self.close_buffer_dialog.set_transient_for(self.window)
-        dic = {
+        """the dialog itself is built the first time it's used"""
+        self.close_buffer_dialog_handlers = {
             "on_button-save_clicked": yes_callback,
             "on_button-close_clicked": no_callback,
             "on_button-cancel_clicked": cancel_callback,
         }
-        self.wTree.signal_autoconnect(dic)
+
+    @property
+    def quitdialog(self):
+        if self._quitdialog is None:
+            self._quitdialog = self._build_dialog(
+                "QuitSave", self.quit_dialog_handlers
+            )
+        return self._quitdialog
+
+    @property
+    def close_buffer_dialog(self):
+        if self._close_buffer_dialog is None:
+            self._close_buffer_dialog = self._build_dialog(
+                "SaveBuffer", self.close_buffer_dialog_handlers
+            )
+        return self._close_buffer_dialog
+
+    def _build_dialog(self, name, handlers):
+        widget_tree = load_widget_tree(
+            os.path.join(self.config.pyroom_absolute_path, "interface.glade"),
+            name
+        )
+        dialog = widget_tree.get_widget(name)
+        dialog.set_transient_for(self.window)
+        widget_tree.signal_autoconnect(handlers)
+        return dialog
 
     def user_wants_to_restore_backup(self):
         restore_dialog = self.create_and_display_restore_dialog()
@@ -489,11 +697,13 @@ Open those instead of the original file?''')
 
 
     def _adjust_window_if_multiple_monitors(self):
+        """move to the monitor with the pointer, and remember its geometry"""
         screen = gtk.gdk.screen_get_default()
         root_window = screen.get_root_window()
         mouse_x, mouse_y, mouse_mods = root_window.get_pointer()
         current_monitor_number = screen.get_monitor_at_point(mouse_x, mouse_y)
         monitor_geometry = screen.get_monitor_geometry(current_monitor_number)
+        self.monitor_geometry = monitor_geometry
         self.window.move(monitor_geometry.x, monitor_geometry.y)
         self.window.set_geometry_hints(
             None,
@@ -618,6 +828,18 @@ class MockGUI(AbstractGUI):
     def show_text_buffer(self, text_buffer):
         super(MockGUI, self).show_text_buffer(text_buffer)
 
+    def show_buffer(self, buf):
+        super(MockGUI, self).show_buffer(buf)
+
+    def scroll_to_cursor(self, buf):
+        super(MockGUI, self).scroll_to_cursor(buf)
+
+    def get_scroll_position(self):
+        return 0
+
+    def set_scroll_position(self, position):
+        pass
+
     def place_cursor_at_start_of_buffer(self, buffer_insert):
         super(MockGUI, self).place_cursor_at_start_of_buffer(buffer_insert)
 
@@ -636,9 +858,15 @@ class MockGUI(AbstractGUI):
     def tell_user(self, *args, **kwargs):
         pass
 
+    def user_wants_to_restore_backup(self):
+        return False
+
     def bind_control_key_commands(self, *args, **kwargs):
         pass
 
+    def bind_scroll_edge_commands(self, *args, **kwargs):
+        pass
+
     def get_displayed_text(self):
         return self.textbox.get_buffer_text()
 
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+
+"""
+one PyRoom per user
+
+The running PyRoom listens on a Unix domain socket. Later invocations send
+their files over it and exit instead of starting a second editor. A request
+is a line naming the mode, "open" or "view" for read-only, followed by one
+escaped absolute filename per line; the running instance answers "ok" once
+it has taken the files.
+"""
+
+import errno
+import os
+import socket
+import tempfile
+
+import gobject
+
+PROTOCOL = 'pyroom-instance 1'
+# how long we wait for a running instance that doesn't answer
+CLIENT_TIMEOUT = 2.0
+
+
+def get_socket_filename():
+    """a socket only the current user can reach"""
+    runtime_directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not runtime_directory or not os.path.isdir(runtime_directory):
+        runtime_directory = os.path.join(
+            tempfile.gettempdir(), 'pyroom-%d' % os.getuid()
+        )
+        try:
+            os.mkdir(runtime_directory, 0700)
+        except OSError, error:
+            if error.errno != errno.EEXIST:
+                raise
+        if os.stat(runtime_directory).st_uid != os.getuid():
+            raise OSError(errno.EPERM, 'not our directory', runtime_directory)
+    return os.path.join(runtime_directory, 'pyroom.socket')
+
+
+def send_to_running_instance(filenames, read_only=False):
+    """hand filenames to a running PyRoom
+
+    returns False if there is none, or it didn't take them"""
+    if not hasattr(socket, 'AF_UNIX'):
+        return False
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(CLIENT_TIMEOUT)
+    try:
+        try:
+            connection.connect(get_socket_filename())
+            lines = [PROTOCOL, read_only and 'view' or 'open']
+            lines.extend(
+                os.path.abspath(filename).encode('string_escape')
+                for filename in filenames
+            )
+            connection.sendall(''.join(line + '\n' for line in lines))
+            connection.shutdown(socket.SHUT_WR)
+            return connection.recv(16) == 'ok\n'
+        except (socket.error, OSError):
+            return False
+    finally:
+        connection.close()
+
+
+class InstanceServer(object):
+    """accept files from later invocations of PyRoom
+
+    on_files(filenames, read_only) is called from the main loop"""
+
+    def __init__(self, on_files):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise OSError(errno.EAFNOSUPPORT, 'no Unix domain sockets')
+        self.on_files = on_files
+        self.socket_filename = get_socket_filename()
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.listener.bind(self.socket_filename)
+        except socket.error, error:
+            if error.errno != errno.EADDRINUSE or self._is_answered():
+                raise
+            # left behind by a PyRoom that crashed
+            os.remove(self.socket_filename)
+            self.listener.bind(self.socket_filename)
+        self.listener.listen(5)
+        self.listener.setblocking(False)
+        self.watch_id = gobject.io_add_watch(
+            self.listener, gobject.IO_IN, self._accept
+        )
+
+    def close(self):
+        gobject.source_remove(self.watch_id)
+        self.listener.close()
+        try:
+            os.remove(self.socket_filename)
+        except OSError:
+            pass
+
+    def _is_answered(self):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_filename)
+        except socket.error:
+            return False
+        finally:
+            probe.close()
+        return True
+
+    def _accept(self, source, condition):
+        try:
+            connection, address = self.listener.accept()
+        except socket.error:
+            return True
+        connection.setblocking(False)
+        gobject.io_add_watch(
+            connection, gobject.IO_IN | gobject.IO_HUP,
+            self._receive, []
+        )
+        return True
+
+    def _receive(self, connection, condition, received):
+        """collect a request without blocking the main loop"""
+        try:
+            data = connection.recv(4096)
+        except socket.error, error:
+            if error.errno == errno.EAGAIN:
+                return True
+            data = ''
+            received[:] = []
+        if data:
+            received.append(data)
+            return True
+        lines = ''.join(received).split('\n')
+        if len(lines) >= 3 and lines[0] == PROTOCOL and \
+           lines[1] in ('open', 'view') and lines[-1] == '':
+            try:
+                connection.sendall('ok\n')
+            except socket.error:
+                pass
+            connection.close()
+            self.on_files(
+                [line.decode('string_escape') for line in lines[2:-1]],
+                lines[1] == 'view'
+            )
+        else:
+            connection.close()
+        return False
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+
+"""
+record what the user does to the shown buffer, and replay it
+
+A trace has one JSON object per line, "t" being the seconds since recording
+started:
+
+    {"t": 0.52, "insert": [12, "a"]}
+    {"t": 0.61, "delete": [11, 12]}
+    {"t": 0.80, "cursor": 4}
+    {"t": 1.25, "key": ["control", "z"]}
+
+Replaying applies the edits to the current buffer as the small inserts and
+deletes they were, at full speed, so recorded writing sessions can be used as
+load tests. Control key commands are run as if the keys were pressed,
+commands that ask the user something will ask again.
+"""
+
+import json
+import time
+
+import gtk
+
+
+def read_trace(filename):
+    """the events of a trace, in order"""
+    trace = open(filename, 'rb')
+    try:
+        for line in trace:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        trace.close()
+
+
+def replay(editor, events):
+    """apply events to editor, returns how many there were"""
+    count = 0
+    for event in events:
+        buf = editor.get_current_buffer()
+        if 'insert' in event:
+            offset, text = event['insert']
+            buf.insert_text(offset, text)
+        elif 'delete' in event:
+            start, end = event['delete']
+            buf.delete_text(start, end)
+        elif 'cursor' in event:
+            buf.place_cursor_at_offset(event['cursor'])
+        elif 'key' in event:
+            modifiers, keyname = event['key']
+            editor.run_key_command(
+                modifiers, gtk.gdk.keyval_from_name(keyname)
+            )
+        count += 1
+    return count
+
+
+def cursor_after_edit(cursor, kind, offset, length):
+    """where an edit leaves a cursor that is not where the edit happens"""
+    if kind == 'insert':
+        if cursor >= offset:
+            return cursor + length
+        return cursor
+    if cursor >= offset + length:
+        return cursor - length
+    return min(cursor, offset)
+
+
+class KeyTraceRecorder(object):
+    """write a trace of the editing done in editor to filename"""
+
+    def __init__(self, editor, filename):
+        self.editor = editor
+        self.filename = filename
+        self.trace_file = None
+        self.started = None
+        self.cursor = None
+
+    def start(self):
+        self.trace_file = open(self.filename, 'wb')
+        self.started = time.time()
+        self.cursor = None
+        for buf in self.editor.buffers:
+            self.watch_buffer(buf)
+        self.editor.key_trace = self
+
+    def stop(self):
+        if self.editor.key_trace is self:
+            self.editor.key_trace = None
+        if self.trace_file is not None:
+            self.trace_file.close()
+            self.trace_file = None
+
+    def watch_buffer(self, buf):
+        buf.add_edit_listener(self.buffer_edited)
+
+    def buffer_edited(self, buf, kind, offset, text):
+        """called after every change, before the cursor moves"""
+        if self.trace_file is None or \
+           buf is not self.editor.get_current_buffer() or \
+           buf.not_undoable_action or buf.undo_in_progress:
+            # loading files and undoing are replayed from their commands
+            return
+        cursor = buf.get_cursor_offset()
+        if cursor != self.cursor:
+            self._write({'cursor': cursor})
+        if kind == 'insert':
+            self._write({'insert': [offset, text]})
+        else:
+            self._write({'delete': [offset, offset + len(text)]})
+        self.cursor = cursor_after_edit(cursor, kind, offset, len(text))
+
+    def key_command(self, modifiers, keyval):
+        """a control key combination is about to run its command"""
+        if self.trace_file is None:
+            return
+        self._write({'key': [modifiers, gtk.gdk.keyval_name(keyval)]})
+        # commands may switch buffers or move the cursor
+        self.cursor = None
+
+    def _write(self, event):
+        event['t'] = round(time.time() - self.started, 3)
+        self.trace_file.write(json.dumps(event, sort_keys=True) + '\n')
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+
+"""
+how long typing takes, in histograms of fixed size
+
+Nothing is measured unless enable() is called before the GUI and the
+buffer views are created; otherwise the signal handlers are connected as
+they are, and cost nothing extra. When enabled we time
+
+    insert-text, delete-range   the UndoableBuffer signal handlers
+    key-to-expose               from a key press that edits the buffer to
+                                the next time the textbox is drawn
+
+Each histogram has a bucket per power of two microseconds.
+"""
+
+import json
+import time
+
+BUCKETS = 25
+
+monitor = None
+
+
+def enable():
+    """start measuring, returns the LatencyMonitor"""
+    global monitor
+    if monitor is None:
+        monitor = LatencyMonitor()
+    return monitor
+
+
+class Histogram(object):
+    """durations counted in buckets of 1, 2, 4, 8... microseconds"""
+
+    def __init__(self):
+        self.buckets = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, seconds):
+        microseconds = int(seconds * 1000000)
+        bucket = min(BUCKETS - 1, max(0, microseconds.bit_length() - 1))
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def percentile(self, percent):
+        """seconds at most percent of the durations took, to a bucket"""
+        if not self.count:
+            return 0.0
+        needed = self.count * percent / 100.0
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= needed:
+                break
+        return min(self.maximum, (2 << bucket) / 1000000.0)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'max': self.maximum,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'buckets_us': dict(
+                (1 << bucket, count)
+                for bucket, count in enumerate(self.buckets) if count
+            ),
+        }
+
+
+class LatencyMonitor(object):
+
+    def __init__(self):
+        self.histograms = {}
+        self.key_pressed_at = None
+        self.edit_pressed_at = None
+
+    def histogram(self, name):
+        if name not in self.histograms:
+            self.histograms[name] = Histogram()
+        return self.histograms[name]
+
+    def timed(self, name, handler):
+        """handler, with the time each call takes added to histogram name"""
+        histogram = self.histogram(name)
+
+        def timed_handler(*args):
+            started = time.time()
+            try:
+                return handler(*args)
+            finally:
+                histogram.add(time.time() - started)
+        return timed_handler
+
+    def timed_edit(self, name, handler):
+        """like timed, for handlers of edits a pressed key may have made"""
+        timed_handler = self.timed(name, handler)
+
+        def edit_handler(*args):
+            self.edited()
+            return timed_handler(*args)
+        return edit_handler
+
+    def key_pressed(self, *args):
+        """connected to key-press-event, lets the key through"""
+        self.key_pressed_at = time.time()
+        return False
+
+    def key_released(self, *args):
+        """connected to key-release-event, a key that edited nothing
+        (a modifier, a command) is not timed"""
+        self.key_pressed_at = None
+        return False
+
+    def edited(self):
+        """the buffer changed, start the clock if a key is held down"""
+        if self.edit_pressed_at is None:
+            self.edit_pressed_at = self.key_pressed_at
+
+    def exposed(self, *args):
+        """connected after expose-event, the edit is on screen"""
+        if self.edit_pressed_at is not None:
+            self.histogram('key-to-expose').add(
+                time.time() - self.edit_pressed_at
+            )
+            self.edit_pressed_at = None
+        return False
+
+    def summary(self):
+        """a line for the status label"""
+        return ', '.join(
+            '%s %.1f/%.1f ms' % (
+                name,
+                1000 * histogram.percentile(50),
+                1000 * histogram.percentile(99)
+            )
+            for name, histogram in sorted(self.histograms.items())
+            if histogram.count
+        )
+
+    def dump(self, filename):
+        report = dict(
+            (name, histogram.to_dict())
+            for name, histogram in self.histograms.items()
+        )
+        report_file = open(filename, 'w')
+        try:
+            report_file.write(
+                json.dumps(report, indent=2, sort_keys=True) + '\n'
+            )
+        finally:
+            report_file.close()
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+
+"""
+pure python document model
+
+A piece table keeps the document as a sequence of pieces, each one a slice
+of an immutable source string (the text of a loaded file or some inserted
+text). The pieces are nodes of a treap ordered by document offset, each node
+knowing the length and newline count of its subtree, so inserting or
+deleting at an offset takes O(log n) and reading a slice only visits the
+pieces it covers. Text inserted right where a short piece ends is added to
+that piece, so typing a word makes one piece rather than one per character.
+
+Nodes are never changed once built; edits create new paths through the tree.
+This makes snapshots free: a snapshot simply keeps the old root around.
+
+No GTK in here, the model has to work without a display.
+"""
+
+import random
+
+# split large inserts so a later edit never has to scan a huge piece
+MAX_PIECE_LENGTH = 16384
+# extending a piece copies it, so only pieces up to this length grow
+MAX_EXTENDED_LENGTH = 1024
+
+
+def to_unicode(text):
+    """GTK hands us utf-8 encoded str, we store unicode"""
+    if isinstance(text, str):
+        return text.decode('utf-8')
+    return text
+
+
+class _Node(object):
+    """one piece of the document and the root of a subtree"""
+    __slots__ = ('text', 'start', 'length', 'newlines', 'priority',
+                 'left', 'right', 'size', 'lines')
+
+    def __init__(self, text, start, length, newlines, priority,
+                 left=None, right=None):
+        self.text = text
+        self.start = start
+        self.length = length
+        self.newlines = newlines
+        self.priority = priority
+        self.left = left
+        self.right = right
+        self.size = length
+        self.lines = newlines
+        if left is not None:
+            self.size += left.size
+            self.lines += left.lines
+        if right is not None:
+            self.size += right.size
+            self.lines += right.lines
+
+    def with_children(self, left, right):
+        return _Node(self.text, self.start, self.length, self.newlines,
+                     self.priority, left, right)
+
+
+def _size(node):
+    if node is None:
+        return 0
+    return node.size
+
+
+def _split(node, offset):
+    """split a subtree into the first offset characters and the rest"""
+    if node is None:
+        return None, None
+    left_size = _size(node.left)
+    if offset <= left_size:
+        left, right = _split(node.left, offset)
+        return left, node.with_children(right, node.right)
+    offset -= left_size
+    if offset >= node.length:
+        left, right = _split(node.right, offset - node.length)
+        return node.with_children(node.left, left), right
+    # the split point is inside this piece, count newlines in the shorter half
+    if offset <= node.length - offset:
+        head_newlines = node.text.count(
+            u'\n', node.start, node.start + offset)
+    else:
+        head_newlines = node.newlines - node.text.count(
+            u'\n', node.start + offset, node.start + node.length)
+    head = _Node(node.text, node.start, offset, head_newlines,
+                 node.priority, node.left, None)
+    tail = _Node(node.text, node.start + offset, node.length - offset,
+                 node.newlines - head_newlines, node.priority,
+                 None, node.right)
+    return head, tail
+
+
+def _merge(left, right):
+    """join two subtrees, all of left comes before all of right"""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        return left.with_children(left.left, _merge(left.right, right))
+    return right.with_children(_merge(left, right.left), right.right)
+
+
+def _extend_last(node, text):
+    """the subtree with text added to its last piece, None if that piece
+    would grow beyond MAX_EXTENDED_LENGTH"""
+    if node.right is not None:
+        right = _extend_last(node.right, text)
+        if right is None:
+            return None
+        return node.with_children(node.left, right)
+    if node.length + len(text) > MAX_EXTENDED_LENGTH:
+        return None
+    piece_text = node.text[node.start:node.start + node.length] + text
+    return _Node(piece_text, 0, len(piece_text),
+                 node.newlines + text.count(u'\n'), node.priority,
+                 node.left, None)
+
+
+def _build(text):
+    """build a subtree holding text, sharing text instead of copying it"""
+    root = None
+    for start in xrange(0, len(text), MAX_PIECE_LENGTH):
+        length = min(MAX_PIECE_LENGTH, len(text) - start)
+        piece = _Node(text, start, length,
+                      text.count(u'\n', start, start + length),
+                      random.random())
+        root = _merge(root, piece)
+    return root
+
+
+class PieceTable(object):
+    """editable text addressed by character offsets"""
+
+    def __init__(self, text=u''):
+        self.root = _build(to_unicode(text))
+
+    def __len__(self):
+        return _size(self.root)
+
+    @property
+    def line_count(self):
+        """number of lines, an empty document has one line like GTK's"""
+        if self.root is None:
+            return 1
+        return self.root.lines + 1
+
+    def insert(self, offset, text):
+        """insert text so that it starts at offset"""
+        text = to_unicode(text)
+        if not text:
+            return
+        left, right = _split(self.root, offset)
+        if left is not None:
+            extended = _extend_last(left, text)
+            if extended is not None:
+                self.root = _merge(extended, right)
+                return
+        self.root = _merge(_merge(left, _build(text)), right)
+
+    def delete(self, start, end):
+        """remove the characters between start and end"""
+        if end <= start:
+            return
+        left, rest = _split(self.root, start)
+        removed, right = _split(rest, end - start)
+        self.root = _merge(left, right)
+
+    def set_text(self, text):
+        self.root = _build(to_unicode(text))
+
+    def iter_chunks(self, start=0, end=None):
+        """yield the text between start and end piece by piece"""
+        if end is None:
+            end = len(self)
+        stack = []
+        node, base = self.root, 0
+        while True:
+            while node is not None:
+                stack.append((node, base))
+                if start < base + _size(node.left):
+                    node = node.left
+                else:
+                    node = None
+            if not stack:
+                return
+            node, base = stack.pop()
+            node_start = base + _size(node.left)
+            if node_start >= end:
+                return
+            node_end = node_start + node.length
+            chunk_start = max(start, node_start) - node_start + node.start
+            chunk_end = min(end, node_end) - node_start + node.start
+            if chunk_start < chunk_end:
+                yield node.text[chunk_start:chunk_end]
+            node, base = node.right, node_end
+
+    def get_slice(self, start, end):
+        return u''.join(self.iter_chunks(start, end))
+
+    def get_text(self):
+        return self.get_slice(0, len(self))
+
+    def snapshot(self):
+        """an independent copy that costs nothing to make
+
+        nodes are immutable, so the copy shares the whole tree"""
+        copy = PieceTable.__new__(PieceTable)
+        copy.root = self.root
+        return copy
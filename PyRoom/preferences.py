@@ -26,6 +26,7 @@ the choice of a theme from $XDG_DATA_HOME/pyroom/themes as well as a custom
 theme created via the dialog
 """
 
+import gobject
 import gtk
 import gtk.glade
 import pango
@@ -38,8 +39,10 @@ else:
     from xdg.BaseDirectory import xdg_config_home as config_home
     from xdg.BaseDirectory import xdg_data_home as data_home
 
-from gui import Theme
+from gui import Theme, theme_catalog
 from pyroom_error import PyroomError
+from glade_loader import load_widget_tree
+from tracing import traced
 
 DEFAULT_CONF = {
     'visual':{
@@ -56,7 +59,9 @@ DEFAULT_CONF = {
     },
     'editor':{
         'autosavetime':'2',
-        'autosave':'0'
+        'autosave':'0',
+        'undolimit':'8192',
+        'viewerthreshold':'256',
     },
 }
 
@@ -84,7 +89,6 @@ class PyroomConfig(SafeConfigParser):
                     '..',
                     'themes'
                 )
-        self.themeslist = self.read_themes_list()
 
     """
     Config parser that returns default values 
@@ -118,26 +122,7 @@ class PyroomConfig(SafeConfigParser):
 
     def read_themes_list(self):
         """get all the theme files sans file suffix and the custom theme"""
-        themeslist = []
-
-        try:
-            rawthemeslist = os.listdir(self.themes_dir)
-        except OSError:
-            rawthemeslist = []
-
-        try:
-            globalthemeslist = os.listdir(self.global_themes_dir)
-        except OSError:
-            globalthemeslist = []
-
-        for themefile in rawthemeslist:
-            if themefile.endswith('theme') and themefile != 'custom.theme':
-                themeslist.append(themefile[:-6])
-        for themefile in globalthemeslist:
-            if themefile.endswith('theme') and themefile != 'custom.theme':
-                if not themefile[:-6] in themeslist:
-                    themeslist.append(themefile[:-6])
-        return themeslist
+        return theme_catalog.theme_names()
 
 class PyroomConfigFileBuilderAndReader(object):
     """Fetches (and/or) builds basic configuration files/dirs."""
@@ -187,15 +172,52 @@ class PyroomConfigFileBuilderAndReader(object):
 
 
 class Preferences(object):
-    """our main preferences object, to be passed around where needed"""
+    """our main preferences object, to be passed around where needed
+
+    only the settings the editor needs are read at startup, the dialog is
+    built the first time it is shown"""
     def __init__(self, gui, pyroom_config):
         self.config = pyroom_config
         self.gui = gui
-        self.wTree = gtk.glade.XML(os.path.join(
+        self.wTree = None
+        self.dlg = None
+        self.fetched_gnome_fonts = False
+        self._gnome_fonts = None
+
+        self.config.showborderstate = int(
+            self.config.get( "visual", "showborder"))
+
+        self.autosavestate = int(self.config.get("editor", "autosave"))
+        if self.autosavestate == 1:
+            self.autosave_time = int(float(
+                self.config.get("editor", "autosavetime")
+            ))
+        else:
+            self.autosave_time = 0
+        self.linespacing = self.config.get("visual", "linespacing")
+        if self.config.get('visual', 'use_font_type') == 'custom':
+            self.set_font()
+        else:
+            # asking gconf for the desktop font waits until the window is up
+            gobject.idle_add(
+                self.set_desktop_font, priority=gobject.PRIORITY_LOW
+            )
+
+    @property
+    def gnome_fonts(self):
+        """the gnome font settings, asked for once we need them"""
+        if not self.fetched_gnome_fonts:
+            self._gnome_fonts = self.get_gnome_fonts()
+            self.fetched_gnome_fonts = True
+        return self._gnome_fonts
+
+    @traced('build preferences dialog')
+    def build_dialog(self):
+        """create the preferences dialog and fill it with our settings"""
+        self.wTree = load_widget_tree(os.path.join(
             self.config.pyroom_absolute_path, "interface.glade"),
             "dialog-preferences")
 
-        self.gnome_fonts = self.get_gnome_fonts()
         # Defining widgets needed
         self.window = self.wTree.get_widget("dialog-preferences")
         self.colorpreference = self.wTree.get_widget("colorbutton")
@@ -239,20 +261,11 @@ class Preferences(object):
         # Getting preferences from conf file
         self.activestyle = self.config.get("visual", "theme")
 
-        self.config.showborderstate = int(
-            self.config.get( "visual", "showborder"))
-
-        self.autosavestate = self.config.get("editor", "autosave")
-        if int(self.autosavestate) == 1:
-            self.autosave_time = self.config.get("editor", "autosavetime")
-        else:
-            self.autosave_time = 0
-        self.linespacing = self.config.get("visual", "linespacing")
-        self.autosavestate = int(self.autosavestate)
-
         # Set up pyroom from conf file
         self.linespacing_spinbutton.set_value(int(self.linespacing))
-        self.autosave_spinbutton.set_value(float(self.autosave_time))
+        self.autosave_spinbutton.set_value(float(
+            self.config.get("editor", "autosavetime")
+        ))
         self.autosave.set_active(self.autosavestate)
         self.showborderbutton.set_active(self.config.showborderstate)
         font_type = self.config.get('visual', 'use_font_type')
@@ -265,9 +278,8 @@ class Preferences(object):
         self.stylesvalues = {'custom': 0}
         self.startingvalue = 1
 
-        self.gui.theme = Theme(self.config.get('visual', 'theme'))
         # Add themes to combobox
-        for i in self.config.themeslist:
+        for i in self.config.read_themes_list():
             self.stylesvalues['%s' % (i)] = self.startingvalue
             self.startingvalue = self.startingvalue + 1
             current_loading_theme = Theme(i)
@@ -307,7 +319,6 @@ class Preferences(object):
         for widget in self.font_radios.values():
             widget.connect('toggled', self.change_font)
         self.custom_font_preference.connect('font-set', self.change_font)
-        self.set_font()
 
     def get_gnome_fonts(self):
         """test if gnome font settings exist"""
@@ -328,6 +339,7 @@ class Preferences(object):
         else:
             return fonts
 
+    @traced('change font')
     def change_font(self, widget):
         if widget.get_name() in ('fontbutton1', 'radio_custom_font'):
             self.custom_font_preference.set_sensitive(True)
@@ -341,6 +353,11 @@ class Preferences(object):
         self.set_font()
         self.gui.apply_theme()
     
+    def set_desktop_font(self):
+        """idle callback setting the gnome font the user chose"""
+        self.set_font()
+        return False
+
     def set_font(self):
         """set font according to settings"""
         if self.config.get('visual', 'use_font_type') == 'custom' or\
@@ -388,6 +405,7 @@ class Preferences(object):
             self.presetscombobox.set_active(theme_id)
         chooser.destroy()
 
+    @traced('set preferences')
     def set_preferences(self, widget, data=None):
         """save preferences"""
         self.build_visual_preferences_from_gui()
@@ -423,6 +441,7 @@ class Preferences(object):
         except IOError:
             raise PyroomError(_("Could not save preferences file."))
             
+    @traced('change custom theme')
     def customchanged(self, widget):
         """triggered when custom themes are changed, reloads style"""
         self.presetscombobox.set_active(0)
@@ -449,6 +468,7 @@ class Preferences(object):
             float(self.gui.theme['height']) * 100
         )
 
+    @traced('change theme')
     def presetchanged(self, widget, mode=None):
         """some presets have changed, apply those"""
         active_theme_id = self.presetscombobox.get_active()
@@ -503,9 +523,13 @@ class Preferences(object):
 
     def show(self):
         """display the preferences dialog"""
+        theme_catalog.refresh()
+        if self.wTree is None:
+            self.build_dialog()
         self.dlg = self.wTree.get_widget("dialog-preferences")
         self.dlg.show()
 
+    @traced('toggle indent')
     def toggle_indent(self, widget):
         """toggle textbox indent"""
         if self.config.get('visual', 'indent') == '1':
@@ -514,6 +538,7 @@ class Preferences(object):
             self.config.set('visual', 'indent', '1')
         self.gui.apply_theme()
 
+    @traced('toggle border')
     def toggleborder(self, widget):
         """toggle border display"""
         if self.config.showborderstate:
@@ -529,6 +554,7 @@ class Preferences(object):
             self.config.showborderstate
         )
 
+    @traced('change line spacing')
     def changelinespacing(self, widget):
         """Change line spacing"""
         self.linespacing = self.linespacing_spinbutton.get_value()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+
+"""
+save files without blocking the main loop
+
+Saves take an immutable snapshot of the document on the main thread and are
+written by a background thread; completion is reported back through the
+gobject main loop.
+"""
+
+import threading
+
+import gobject
+
+from atomic_file import write_atomically
+from tracing import traced
+
+
+class SnapshotSave(object):
+    """write a document snapshot to a file
+
+    on_finished(job, error) is called in the main loop once the file has been
+    written, error is None on success"""
+
+    def __init__(self, filename, document, on_finished=None):
+        self.filename = filename
+        self.document = document
+        self.on_finished = on_finished
+
+    @traced('write file', 'save worker')
+    def run(self):
+        write_atomically(
+            self.filename,
+            (chunk.encode('utf-8') for chunk in self.document.iter_chunks())
+        )
+
+    def absorb(self, previous):
+        """take over what a replaced, never started job still had to do
+
+        a newer snapshot already contains everything an older one had"""
+        pass
+
+    def finished(self, error):
+        if self.on_finished:
+            self.on_finished(self, error)
+        return False
+
+
+class SaveWorker(object):
+    """a background thread running save jobs one after another
+
+    jobs are submitted under a key; a job that is still waiting is replaced
+    by a newer job with the same key instead of being written twice
+
+    failures maps the keys whose last job failed to (job, error); errors
+    also reach job.finished, but only once the main loop runs again"""
+
+    def __init__(self):
+        gobject.threads_init()
+        self.condition = threading.Condition()
+        self.pending = {}
+        self.queue = []
+        self.running_key = None
+        self.failures = {}
+        self.stopping = False
+        self.thread = None
+
+    def submit(self, key, job):
+        self.condition.acquire()
+        try:
+            previous = self.pending.get(key)
+            if previous is not None:
+                job.absorb(previous)
+            else:
+                self.queue.append(key)
+            self.pending[key] = job
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._work)
+                self.thread.setDaemon(True)
+                self.thread.start()
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+    def discard(self, key):
+        """forget a waiting job and wait for a running one with this key"""
+        self.condition.acquire()
+        try:
+            if self.pending.pop(key, None) is not None:
+                self.queue.remove(key)
+            while self.running_key == key:
+                self.condition.wait()
+        finally:
+            self.condition.release()
+
+    def forget_failure(self, key):
+        self.condition.acquire()
+        try:
+            self.failures.pop(key, None)
+        finally:
+            self.condition.release()
+
+    def wait(self):
+        """block until everything submitted so far has been written
+
+        returns the failures"""
+        self.condition.acquire()
+        try:
+            while self.queue or self.running_key is not None:
+                self.condition.wait()
+            return dict(self.failures)
+        finally:
+            self.condition.release()
+
+    def stop(self):
+        """write what is left and end the thread, returns the failures"""
+        self.condition.acquire()
+        try:
+            self.stopping = True
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.stopping = False
+        return dict(self.failures)
+
+    def _work(self):
+        while True:
+            self.condition.acquire()
+            try:
+                while not self.queue and not self.stopping:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                key = self.queue.pop(0)
+                job = self.pending.pop(key)
+                self.running_key = key
+            finally:
+                self.condition.release()
+            error = None
+            try:
+                job.run()
+            except Exception, error:
+                pass
+            gobject.idle_add(job.finished, error)
+            self.condition.acquire()
+            try:
+                if error is None:
+                    self.failures.pop(key, None)
+                else:
+                    self.failures[key] = (job, error)
+                self.running_key = None
+                self.condition.notifyAll()
+            finally:
+                self.condition.release()
@@ -1,4 +1,22 @@
+import hashlib
+import os
 import shelve
+import zlib
+
+import gobject
+
+from atomic_file import write_atomically
+
+CACHE_READ_SIZE = 256 * 1024
+
+
+def file_fingerprint(filename):
+    """size and modification time of a file, None if it can't be read"""
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (stat.st_size, int(stat.st_mtime * 1000))
 
 
 class Session(object):
@@ -17,36 +35,280 @@ class Session(object):
     def clear(self):
         raise NotImplementedError("Please Implement this method")
 
+    def flush(self):
+        """write changes that are still held back"""
+        pass
+
+    def set_file_state(self, filename, cursor, scroll, fingerprint):
+        """remember where the user was in a file with this fingerprint"""
+        pass
+
+    def get_file_state(self, filename):
+        """
+        :return: (cursor, scroll, fingerprint) or None
+        """
+        return None
+
+    def cache_text(self, filename, fingerprint, document):
+        """keep the text of a file with this fingerprint for next time"""
+        pass
+
+    def get_cached_text(self, filename, fingerprint):
+        """the cached text if the file still has this fingerprint, or None"""
+        return None
+
 
 class FileStoreSession(Session):
+    """the open filenames, kept in memory and stored as an append-only log
+
+    every change becomes one line in the log: "+ name" adds a filename,
+    "- name" removes it, "0" clears the list and
+    "s cursor scroll size mtime name" records where the user was in a file.
+    Changes are written in batches from an idle callback or on flush(), each
+    batch with a single write followed by fsync; a torn last line is ignored
+    when reading, so after a crash the session is the one from before some
+    batch. The log is rewritten atomically once it holds many more lines than
+    filenames.
+
+    the text of files is cached zlib compressed next to the log, so
+    unchanged files can be restored without reading them again"""
 
     file_list_key = 'open_filenames'
+    header = 'PYROOM-SESSION 1\n'
+    # logs with fewer lines than this are never compacted
+    min_compact_lines = 64
 
     def __init__(self, filepath):
+        self.filepath = filepath
         self.filenames = []
-        self.shelve_filepath = filepath
-        self.shelf = shelve.open(self.shelve_filepath)
-        if self.shelf.get(self.file_list_key) is None:
-            self.shelf[self.file_list_key] = []
+        self.file_states = {}
+        self.cache_directory = filepath + '.cache'
+        self.pending_lines = []
+        self.log_lines = 0
+        # a crash cut the last line short, appending would continue it
+        self.log_torn = False
+        self.flush_id = 0
+        if not self._read_log():
+            self._migrate_shelf()
 
     def add_open_filename(self, filename):
-        file_list = self.shelf.get(self.file_list_key)
-        file_list.append(filename)
-        self.shelf[self.file_list_key] = file_list
-        self.shelf.sync()
+        self.filenames.append(filename)
+        self._log('+ ' + _escape(filename))
 
     def remove_open_filename(self, filename):
-        if filename in self.get_open_filenames():
-            file_list = self.get_open_filenames()
-            file_list.remove(filename)
-            self.shelf[self.file_list_key] = file_list
-            self.shelf.sync()
+        if filename in self.filenames:
+            self.filenames.remove(filename)
+            self._log('- ' + _escape(filename))
+            if filename not in self.filenames:
+                self._forget_file(filename)
 
     def get_open_filenames(self):
-        return self.shelf.get(self.file_list_key)
+        return list(self.filenames)
 
     def clear(self):
-        self.shelf[self.file_list_key] = []
+        for filename in self.filenames:
+            self._forget_file(filename)
+        self.filenames = []
+        self._log('0')
+
+    def set_file_state(self, filename, cursor, scroll, fingerprint):
+        state = (cursor, scroll, fingerprint)
+        if filename not in self.filenames or \
+           self.file_states.get(filename) == state:
+            return
+        self.file_states[filename] = state
+        self._log(_state_line(filename, state))
+
+    def get_file_state(self, filename):
+        return self.file_states.get(filename)
+
+    def cache_text(self, filename, fingerprint, document):
+        if self._cached_fingerprint(filename) == fingerprint:
+            return
+        if not os.path.isdir(self.cache_directory):
+            os.makedirs(self.cache_directory)
+        write_atomically(
+            self._cache_filename(filename),
+            _compress(
+                '%d %d\n' % fingerprint,
+                (chunk.encode('utf-8') for chunk in document.iter_chunks())
+            )
+        )
+
+    def get_cached_text(self, filename, fingerprint):
+        if fingerprint is None:
+            return None
+        try:
+            cache = open(self._cache_filename(filename), 'rb')
+        except IOError:
+            return None
+        try:
+            if cache.readline() != '%d %d\n' % fingerprint:
+                return None
+            decompressor = zlib.decompressobj()
+            data = [decompressor.decompress(chunk) for chunk in
+                    iter(lambda: cache.read(CACHE_READ_SIZE), '')]
+            data.append(decompressor.flush())
+            return ''.join(data).decode('utf-8')
+        except (IOError, zlib.error, UnicodeDecodeError):
+            return None
+        finally:
+            cache.close()
+
+    def _cached_fingerprint(self, filename):
+        try:
+            cache = open(self._cache_filename(filename), 'rb')
+        except IOError:
+            return None
+        try:
+            fields = cache.readline().split()
+        finally:
+            cache.close()
+        if len(fields) != 2 or not fields[0].isdigit() or \
+           not fields[1].isdigit():
+            return None
+        return (int(fields[0]), int(fields[1]))
+
+    def _cache_filename(self, filename):
+        if isinstance(filename, unicode):
+            filename = filename.encode('utf-8')
+        return os.path.join(
+            self.cache_directory, hashlib.sha1(filename).hexdigest()
+        )
+
+    def _forget_file(self, filename):
+        self.file_states.pop(filename, None)
+        try:
+            os.remove(self._cache_filename(filename))
+        except OSError:
+            pass
+
+    def flush(self):
+        if self.flush_id:
+            gobject.source_remove(self.flush_id)
+            self.flush_id = 0
+        if not self.pending_lines:
+            return
+        lines, self.pending_lines = self.pending_lines, []
+        if self.log_lines + len(lines) > max(
+            self.min_compact_lines, 4 * len(self.filenames)
+        ):
+            self._compact()
+            return
+        if self.log_torn or not os.path.isfile(self.filepath):
+            self._compact()
+            return
+        log = open(self.filepath, 'ab')
+        try:
+            log.write(''.join(line + '\n' for line in lines))
+            log.flush()
+            os.fsync(log.fileno())
+        finally:
+            log.close()
+        self.log_lines += len(lines)
+
+    def _log(self, line):
+        self.pending_lines.append(line)
+        if not self.flush_id:
+            self.flush_id = gobject.idle_add(self._idle_flush)
+
+    def _idle_flush(self):
+        self.flush_id = 0
+        self.flush()
+        return False
+
+    def _compact(self):
+        """replace the log with one that only adds the current filenames"""
+        lines = ['+ ' + _escape(filename) for filename in self.filenames]
+        lines.extend(_state_line(filename, state)
+                     for filename, state in self.file_states.items()
+                     if filename in self.filenames)
+        write_atomically(
+            self.filepath,
+            [self.header] + [line + '\n' for line in lines]
+        )
+        self.log_lines = len(lines)
+        self.log_torn = False
+
+    def _read_log(self):
+        """returns False if there is no log at filepath"""
+        try:
+            log = open(self.filepath, 'rb')
+        except IOError:
+            return False
+        try:
+            data = log.read()
+        finally:
+            log.close()
+        if not data.startswith(self.header):
+            return False
+        lines = data[len(self.header):].split('\n')
+        # the last line is empty unless a crash cut it short
+        for line in lines[:-1]:
+            if line == '0':
+                self.filenames = []
+                self.file_states = {}
+            elif line.startswith('+ '):
+                self.filenames.append(_unescape(line[2:]))
+            elif line.startswith('- '):
+                filename = _unescape(line[2:])
+                if filename in self.filenames:
+                    self.filenames.remove(filename)
+                if filename not in self.filenames:
+                    self.file_states.pop(filename, None)
+            elif line.startswith('s '):
+                fields = line.split(' ', 5)
+                if len(fields) == 6 and \
+                   all(field.isdigit() for field in fields[1:5]):
+                    cursor, scroll, size, mtime = map(int, fields[1:5])
+                    self.file_states[_unescape(fields[5])] = (
+                        cursor, scroll, (size, mtime)
+                    )
+        self.log_lines = len(lines) - 1
+        self.log_torn = not data.endswith('\n')
+        return True
+
+    def _migrate_shelf(self):
+        """take over the filenames of a session stored by older versions
+
+        depending on the dbm module, shelve adds a suffix to the filename"""
+        if not [suffix for suffix in ('', '.db', '.dat')
+                if os.path.isfile(self.filepath + suffix)]:
+            return
+        try:
+            shelf = shelve.open(self.filepath, 'r')
+            try:
+                self.filenames = list(shelf.get(self.file_list_key) or [])
+            finally:
+                shelf.close()
+        except Exception:
+            self.filenames = []
+        self._compact()
+
+
+def _escape(filename):
+    if isinstance(filename, unicode):
+        filename = filename.encode('utf-8')
+    return filename.encode('string_escape')
+
+
+def _unescape(line):
+    return line.decode('string_escape')
+
+
+def _state_line(filename, state):
+    cursor, scroll, (size, mtime) = state
+    return 's %d %d %d %d %s' % (cursor, scroll, size, mtime, _escape(filename))
+
+
+def _compress(header, chunks):
+    yield header
+    compressor = zlib.compressobj(1)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
 
 
 class PrivateSession(Session):
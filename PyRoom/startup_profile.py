@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+
+"""
+time the phases of starting PyRoom
+
+A phase ends with a call to mark(); it lasted from the previous mark, or
+from when the profiler was started. The report is JSON so runs can be
+compared by scripts:
+
+    {"pyroom": "0.4.2", "total": 0.61,
+     "phases": [{"name": "imports", "seconds": 0.25}, ...]}
+"""
+
+import json
+import sys
+import time
+
+
+class StartupProfiler(object):
+
+    def __init__(self, started=None):
+        if started is None:
+            started = time.time()
+        self.started = started
+        self.last_mark = started
+        self.phases = []
+
+    def mark(self, name):
+        """the phase called name ends now"""
+        now = time.time()
+        self.phases.append((name, now - self.last_mark))
+        self.last_mark = now
+
+    def report(self, version):
+        return {
+            'pyroom': version,
+            'total': self.last_mark - self.started,
+            'phases': [
+                {'name': name, 'seconds': seconds}
+                for name, seconds in self.phases
+            ],
+        }
+
+    def dump(self, filename, version):
+        """write the report to filename, '-' is stderr"""
+        report = json.dumps(self.report(version), indent=2, sort_keys=True)
+        if filename == '-':
+            sys.stderr.write(report + '\n')
+            return
+        report_file = open(filename, 'w')
+        try:
+            report_file.write(report + '\n')
+        finally:
+            report_file.close()
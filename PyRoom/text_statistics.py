@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+
+"""
+word statistics kept up to date while typing
+
+Words are split the way Pango splits them for GTK's word iterators: a word
+is a run of letters or a run of digits, combining marks and format
+characters after either belong to it, anything else (spaces, punctuation,
+underscores, apostrophes) ends it. Whether an edit joins or splits words
+only depends on the characters next to it, so every insertion or deletion
+is counted by looking at the edited text plus the nearest character on each
+side that is not a mark.
+"""
+
+import re
+import unicodedata
+
+LETTER_CATEGORIES = ('Lu', 'Ll', 'Lt', 'Lm', 'Lo')
+NUMBER_CATEGORIES = ('Nd', 'Nl', 'No')
+MARK_CATEGORIES = ('Mn', 'Mc', 'Me', 'Cf')
+
+
+def _character_classes(*groups):
+    """regular expression character classes, one per group of categories,
+    of the characters in the basic multilingual plane"""
+    ranges = dict((group, []) for group in groups)
+    ranges_of_category = {}
+    for group in groups:
+        for category in group:
+            ranges_of_category[category] = ranges[group]
+    category_of = unicodedata.category
+    for code in xrange(0x10000):
+        group_ranges = ranges_of_category.get(category_of(unichr(code)))
+        if group_ranges is None:
+            continue
+        if group_ranges and group_ranges[-1][1] == code - 1:
+            group_ranges[-1][1] = code
+        else:
+            group_ranges.append([code, code])
+    return [
+        u'[%s]' % u''.join(
+            u'%s-%s' % (re.escape(unichr(first)), re.escape(unichr(last)))
+            for first, last in ranges[group]
+        )
+        for group in groups
+    ]
+
+
+_word = None
+
+
+def _word_pattern():
+    """the regular expression of a word, built on first use since going
+    through the character database takes a noticeable part of startup"""
+    global _word
+    if _word is None:
+        letter, number, mark = _character_classes(
+            LETTER_CATEGORIES, NUMBER_CATEGORIES, MARK_CATEGORIES
+        )
+        _word = re.compile(
+            u'%(letter)s(?:%(letter)s|%(mark)s)*'
+            u'|%(number)s(?:%(number)s|%(mark)s)*'
+            % {'letter': letter, 'number': number, 'mark': mark}
+        )
+    return _word
+
+
+def is_mark(character):
+    """marks and format characters belong to the word before them"""
+    return unicodedata.category(character) in MARK_CATEGORIES
+
+
+def count_words(text):
+    """count words the slow way, by scanning all of text"""
+    if not text:
+        return 0
+    count = 0
+    for match in _word_pattern().finditer(text):
+        count += 1
+    return count
+
+
+class TextStatistics(object):
+    """word count of a PieceTable, updated edit by edit
+
+    the hooks have to be called before the document itself changes"""
+
+    def __init__(self):
+        self.words = 0
+
+    def before_insert(self, document, offset, text):
+        before, after = self._neighbours(document, offset, offset)
+        self.words += count_words(before + text + after) - \
+            count_words(before + after)
+
+    def before_delete(self, document, start, end, deleted_text):
+        before, after = self._neighbours(document, start, end)
+        self.words += count_words(before + after) - \
+            count_words(before + deleted_text + after)
+
+    def _neighbours(self, document, start, end):
+        """the text from the last character before start that is not a
+        mark, and up to the first one after end"""
+        before = start
+        while before > 0:
+            before -= 1
+            if not is_mark(document.get_slice(before, before + 1)):
+                break
+        after = end
+        length = len(document)
+        while after < length:
+            after += 1
+            if not is_mark(document.get_slice(after - 1, after)):
+                break
+        return (document.get_slice(before, start),
+                document.get_slice(end, after))
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+
+"""
+a timeline of what the editor did, for chrome://tracing and similar viewers
+
+Functions decorated with @traced(name) are recorded as one span per call
+once enable() has been called; until then the decorator only adds a check.
+Only the most recent spans are kept, so tracing can stay on in long
+sessions. dump() writes them in the trace event format:
+
+    {"traceEvents": [{"name": "save", "cat": "editor", "ph": "X",
+                      "ts": 1520, "dur": 310, "pid": 4711, "tid": 1}, ...]}
+"""
+
+import collections
+import functools
+import json
+import os
+import thread
+import time
+
+DEFAULT_CAPACITY = 100000
+
+tracer = None
+
+
+def enable(capacity=DEFAULT_CAPACITY):
+    """start tracing, returns the Tracer"""
+    global tracer
+    if tracer is None:
+        tracer = Tracer(capacity)
+    return tracer
+
+
+def traced(name, category='editor'):
+    """record every call of the decorated function as a span called name"""
+    def decorate(function):
+        @functools.wraps(function)
+        def traced_function(*args, **kwargs):
+            if tracer is None:
+                return function(*args, **kwargs)
+            started = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                tracer.record(name, category, started, time.time())
+        return traced_function
+    return decorate
+
+
+class Tracer(object):
+    """the last capacity spans, oldest first"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.started = time.time()
+        # appending to a deque is atomic, the save worker traces too
+        self.spans = collections.deque(maxlen=capacity)
+
+    def record(self, name, category, started, finished):
+        self.spans.append(
+            (name, category, started, finished, thread.get_ident())
+        )
+
+    def trace_events(self):
+        pid = os.getpid()
+        thread_numbers = {}
+        events = []
+        for name, category, started, finished, thread_id in list(self.spans):
+            tid = thread_numbers.setdefault(
+                thread_id, len(thread_numbers) + 1
+            )
+            events.append({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': int((started - self.started) * 1000000),
+                'dur': int((finished - started) * 1000000),
+                'pid': pid,
+                'tid': tid,
+            })
+        return events
+
+    def dump(self, filename):
+        trace_file = open(filename, 'w')
+        try:
+            json.dump({
+                'traceEvents': self.trace_events(),
+                'displayTimeUnit': 'ms',
+            }, trace_file)
+        finally:
+            trace_file.close()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+
+"""
+bounded undo and redo history
+
+keeps undo and redo records within a byte budget so long writing sessions
+don't grow without limit; the oldest records are evicted first
+"""
+
+from collections import deque
+
+# approximate cost of one slotted record plus its slot in the deque
+RECORD_OVERHEAD = 64
+DEFAULT_BYTE_BUDGET = 8 * 1024 * 1024
+
+
+def record_size(record):
+    """estimate how many bytes a record keeps alive"""
+    return RECORD_OVERHEAD + record.text_size()
+
+
+class UndoJournal(object):
+    """undo and redo stacks sharing one byte budget
+
+    records are pushed and popped like the plain lists we used to have;
+    whenever the budget is exceeded the oldest undo records are dropped,
+    then the furthest redo records"""
+
+    def __init__(self, byte_budget=DEFAULT_BYTE_BUDGET):
+        self.byte_budget = byte_budget
+        self.undo_records = deque()
+        self.redo_records = deque()
+        self.size = 0
+
+    def __len__(self):
+        return len(self.undo_records) + len(self.redo_records)
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_records)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_records)
+
+    def last_undo(self):
+        """most recent undo record or None"""
+        if self.undo_records:
+            return self.undo_records[-1]
+        return None
+
+    def push_undo(self, record):
+        """record a new undoable action"""
+        self.undo_records.append(record)
+        self.size += record_size(record)
+        self._evict()
+
+    def amend_last_undo(self, added_bytes):
+        """account for text merged into the most recent undo record"""
+        self.size += added_bytes
+        self._evict()
+
+    def pop_undo(self):
+        """move the most recent undo record to the redo stack"""
+        record = self.undo_records.pop()
+        self.redo_records.append(record)
+        return record
+
+    def pop_redo(self):
+        """move the most recent redo record back to the undo stack"""
+        record = self.redo_records.pop()
+        self.undo_records.append(record)
+        return record
+
+    def clear_redo(self):
+        for record in self.redo_records:
+            self.size -= record_size(record)
+        self.redo_records.clear()
+
+    def clear(self):
+        self.undo_records.clear()
+        self.redo_records.clear()
+        self.size = 0
+
+    def _evict(self):
+        """drop oldest records until we fit into our budget
+
+        the most recent undo record always survives, even if it alone
+        exceeds the budget, so the last typing can still be undone"""
+        while self.size > self.byte_budget and len(self.undo_records) > 1:
+            self.size -= record_size(self.undo_records.popleft())
+        while self.size > self.byte_budget and self.redo_records:
+            self.size -= record_size(self.redo_records.popleft())
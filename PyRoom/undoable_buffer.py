@@ -1,43 +1,138 @@
-import gtk
-
 from undoable_insert import UndoableInsert
 from undoable_delete import UndoableDelete
+from undo_journal import UndoJournal, DEFAULT_BYTE_BUDGET
+from piece_table import PieceTable, to_unicode
+from text_statistics import TextStatistics
+import latency
 
 
 FILE_UNNAMED = _('* Unnamed *')
 
 
 
-class UndoableBuffer(gtk.TextBuffer):
+class UndoableBuffer(object):
     """text buffer with added undo capabilities
 
     designed as a drop-in replacement for gtksourceview,
-    at least as far as undo is concerned"""
+    at least as far as undo is concerned
+
+    the text itself lives in a PieceTable; a gtk.TextBuffer is only created
+    once a view asks for it, from then on it is kept in sync through its
+    insert-text and delete-range signals. Without a view everything works
+    without GTK."""
     
-    def __init__(self):
+    def __init__(self, undo_budget=DEFAULT_BYTE_BUDGET):
         """
-        we'll need empty stacks for undo/redo and some state keeping
+        we'll need an empty undo/redo journal and some state keeping
+
+        undo_budget caps the memory, in bytes, the undo history may hold
         """
         self.filename = FILE_UNNAMED
-        self.undo_stack = []
-        self.redo_stack = []
+        self.history = UndoJournal(undo_budget)
+        self.document = PieceTable()
+        self.statistics = TextStatistics()
+        self.generation = 0
+        self.edit_listeners = []
+        self.cursor = 0
         self.modified = False
         self.not_undoable_action = False
         self.undo_in_progress = False
-        self.text_buffer = gtk.TextBuffer()
-        self.text_buffer.connect('insert-text', self.on_insert_text)
-        self.text_buffer.connect('delete-range', self.on_delete_range)
-        self.text_buffer.connect('begin_user_action', self.on_begin_user_action)
+        self.loader = None
+        self.viewer = None
+        # restored from the session but not read yet
+        self.placeholder = False
+        # size and mtime of the file when it was last read or written
+        self.disk_fingerprint = None
+        self._text_buffer = None
+        self._view_handler_ids = []
+
+    @property
+    def text_buffer(self):
+        """gtk.TextBuffer mirroring our document, created on first use"""
+        if self._text_buffer is None:
+            self.attach_view()
+        return self._text_buffer
+
+    @property
+    def has_view(self):
+        return self._text_buffer is not None
+
+    @property
+    def is_loading(self):
+        return self.loader is not None
+
+    @property
+    def is_read_only(self):
+        """we only show a window of a MappedFile"""
+        return self.viewer is not None
+
+    @property
+    def editable(self):
+        """whether the user may type into us right now"""
+        return not self.is_loading and not self.is_read_only and \
+               not self.placeholder
+
+    def attach_view(self):
+        """create the gtk.TextBuffer a TextView can display"""
+        import gtk
+        text_buffer = gtk.TextBuffer()
+        text_buffer.set_text(self.get_text_from_buffer())
+        text_buffer.place_cursor(text_buffer.get_iter_at_offset(self.cursor))
+        on_insert_text = self.on_insert_text
+        on_delete_range = self.on_delete_range
+        if latency.monitor is not None:
+            on_insert_text = latency.monitor.timed_edit(
+                'insert-text', on_insert_text
+            )
+            on_delete_range = latency.monitor.timed_edit(
+                'delete-range', on_delete_range
+            )
+        self._view_handler_ids = [
+            text_buffer.connect('insert-text', on_insert_text),
+            text_buffer.connect('delete-range', on_delete_range),
+            text_buffer.connect(
+                'begin_user_action', self.on_begin_user_action
+            ),
+        ]
+        self._text_buffer = text_buffer
+
+    def detach_view(self):
+        """drop the gtk.TextBuffer so the document is our only copy of the
+        text, until a view is attached again"""
+        if self._text_buffer is None:
+            return
+        self.cursor = self.get_cursor_offset()
+        for handler_id in self._view_handler_ids:
+            self._text_buffer.disconnect(handler_id)
+        self._view_handler_ids = []
+        self._text_buffer = None
 
     @property
     def can_undo(self):
-        return bool(self.undo_stack)
+        return self.history.can_undo
 
     @property
     def can_redo(self):
-        return bool(self.redo_stack)
+        return self.history.can_redo
+
+    @property
+    def history_size(self):
+        """bytes currently held by undo and redo history"""
+        return self.history.size
 
     def on_insert_text(self, textbuffer, text_iter, text, length):
+        self.record_insert(text_iter.get_offset(), to_unicode(text))
+
+    def on_delete_range(self, text_buffer, start_iter, end_iter):
+        cursor_offset = text_buffer.get_iter_at_mark(
+            text_buffer.get_insert()
+        ).get_offset()
+        self.record_delete(
+            start_iter.get_offset(), end_iter.get_offset(), cursor_offset
+        )
+
+    def record_insert(self, offset, text):
+        """apply an insertion to our document and remember how to undo it"""
         def can_be_merged(prev, cur):
             """see if we can merge multiple inserts here
 
@@ -50,36 +145,38 @@ class UndoableBuffer(gtk.TextBuffer):
                 return False
             if cur.offset != (prev.offset + prev.length):
                 return False
-            if cur.text in WHITESPACE and not prev.text in WHITESPACE:
+            cur_is_whitespace = cur.text_is_one_of(WHITESPACE)
+            prev_is_whitespace = prev.text_is_one_of(WHITESPACE)
+            if cur_is_whitespace and not prev_is_whitespace:
                 return False
-            elif prev.text in WHITESPACE and not cur.text in WHITESPACE:
+            elif prev_is_whitespace and not cur_is_whitespace:
                 return False
             return True
 
+        self.statistics.before_insert(self.document, offset, text)
+        self.document.insert(offset, text)
+        self._notify_edit_listeners('insert', offset, text)
         if not self.undo_in_progress:
-            self.redo_stack = []
+            self.history.clear_redo()
         if self.not_undoable_action:
             return
-        undo_action = UndoableInsert(text_iter, text, length)
-        try:
-            prev_insert = self.undo_stack.pop()
-        except IndexError:
-            self.undo_stack.append(undo_action)
+        self.modified = True
+        undo_action = UndoableInsert(offset, text)
+        prev_insert = self.history.last_undo()
+        if prev_insert is None:
+            self.history.push_undo(undo_action)
             return
         if not isinstance(prev_insert, UndoableInsert):
-            self.undo_stack.append(prev_insert)
-            self.undo_stack.append(undo_action)
+            self.history.push_undo(undo_action)
             return
         if can_be_merged(prev_insert, undo_action):
-            prev_insert.length += undo_action.length
-            prev_insert.text += undo_action.text
-            self.undo_stack.append(prev_insert)
+            prev_insert.merge(undo_action)
+            self.history.amend_last_undo(undo_action.text_size())
         else:
-            self.undo_stack.append(prev_insert)
-            self.undo_stack.append(undo_action)
-        self.modified = True
+            self.history.push_undo(undo_action)
         
-    def on_delete_range(self, text_buffer, start_iter, end_iter):
+    def record_delete(self, start, end, cursor_offset):
+        """apply a deletion to our document and remember how to undo it"""
         def can_be_merged(prev, cur):
             """see if we can merge multiple deletions here
 
@@ -92,41 +189,47 @@ class UndoableBuffer(gtk.TextBuffer):
                 return False
             if prev.start != cur.start and prev.start != cur.end:
                 return False
-            if cur.deleted_text not in WHITESPACE and \
-               prev.deleted_text in WHITESPACE:
+            cur_is_whitespace = cur.text_is_one_of(WHITESPACE)
+            prev_is_whitespace = prev.text_is_one_of(WHITESPACE)
+            if not cur_is_whitespace and prev_is_whitespace:
                 return False
-            elif cur.deleted_text in WHITESPACE and \
-               prev.deleted_text not in WHITESPACE:
+            elif cur_is_whitespace and not prev_is_whitespace:
                 return False
             return True
 
+        deleted_text = self.document.get_slice(start, end)
+        self.statistics.before_delete(self.document, start, end, deleted_text)
+        self.document.delete(start, end)
+        self._notify_edit_listeners('delete', start, deleted_text)
         if not self.undo_in_progress:
-            self.redo_stack = []
+            self.history.clear_redo()
         if self.not_undoable_action:
             return
-        undo_action = UndoableDelete(text_buffer, start_iter, end_iter)
-        try:
-            prev_delete = self.undo_stack.pop()
-        except IndexError:
-            self.undo_stack.append(undo_action)
+        self.modified = True
+        undo_action = UndoableDelete(start, end, deleted_text, cursor_offset)
+        prev_delete = self.history.last_undo()
+        if prev_delete is None:
+            self.history.push_undo(undo_action)
             return
         if not isinstance(prev_delete, UndoableDelete):
-            self.undo_stack.append(prev_delete)
-            self.undo_stack.append(undo_action)
+            self.history.push_undo(undo_action)
             return
         if can_be_merged(prev_delete, undo_action):
-            if prev_delete.start == undo_action.start: # delete key used
-                prev_delete.deleted_text += undo_action.deleted_text
-                prev_delete.end += (undo_action.end - undo_action.start)
-            else: # Backspace used
-                prev_delete.deleted_text = "%s%s" % (undo_action.deleted_text,
-                                                     prev_delete.deleted_text)
-                prev_delete.start = undo_action.start
-            self.undo_stack.append(prev_delete)
+            prev_delete.merge(undo_action)
+            self.history.amend_last_undo(undo_action.text_size())
         else:
-            self.undo_stack.append(prev_delete)
-            self.undo_stack.append(undo_action)
-        self.modified = True
+            self.history.push_undo(undo_action)
+
+    def add_edit_listener(self, callback):
+        """call callback(buf, kind, offset, text) after every change
+
+        kind is 'insert' or 'delete', text what was inserted or deleted"""
+        self.edit_listeners.append(callback)
+
+    def _notify_edit_listeners(self, kind, offset, text):
+        self.generation += 1
+        for callback in self.edit_listeners:
+            callback(self, kind, offset, text)
 
     def on_begin_user_action(self, *args, **kwargs):
         pass
@@ -142,32 +245,82 @@ class UndoableBuffer(gtk.TextBuffer):
         
         toggles self.not_undoable_action"""
         self.not_undoable_action = False
+
+    def insert_text(self, offset, text):
+        """insert text at offset, through the view if we have one"""
+        if not text:
+            return
+        if self._text_buffer is not None:
+            self._text_buffer.insert(
+                self._text_buffer.get_iter_at_offset(offset), text
+            )
+            return
+        text = to_unicode(text)
+        self.record_insert(offset, text)
+        if self.cursor >= offset:
+            self.cursor += len(text)
+
+    def delete_text(self, start, end):
+        """delete the text between two offsets, through the view if any"""
+        if end <= start:
+            return
+        if self._text_buffer is not None:
+            self._text_buffer.delete(
+                self._text_buffer.get_iter_at_offset(start),
+                self._text_buffer.get_iter_at_offset(end)
+            )
+            return
+        self.record_delete(start, end, self.cursor)
+        if self.cursor >= end:
+            self.cursor -= end - start
+        elif self.cursor > start:
+            self.cursor = start
+
+    def place_cursor_at_offset(self, offset):
+        if self._text_buffer is not None:
+            self._text_buffer.place_cursor(
+                self._text_buffer.get_iter_at_offset(offset)
+            )
+        else:
+            self.cursor = offset
+
+    def get_selection_offsets(self):
+        """start and end offset of the selection or None"""
+        if self._text_buffer is None:
+            return None
+        bounds = self._text_buffer.get_selection_bounds()
+        if not bounds:
+            return None
+        return bounds[0].get_offset(), bounds[1].get_offset()
+
+    def get_cursor_offset(self):
+        if self._text_buffer is not None:
+            return self._text_buffer.get_iter_at_mark(
+                self._text_buffer.get_insert()
+            ).get_offset()
+        return self.cursor
     
     def undo(self):
         """undo inserts or deletions
 
         undone actions are being moved to redo stack"""
-        if not self.undo_stack:
+        if not self.history.can_undo:
             return
         self.begin_not_undoable_action()
         self.undo_in_progress = True
-        undo_action = self.undo_stack.pop()
-        self.redo_stack.append(undo_action)
+        undo_action = self.history.pop_undo()
         if isinstance(undo_action, UndoableInsert):
-            start = self.text_buffer.get_iter_at_offset(undo_action.offset)
-            stop = self.text_buffer.get_iter_at_offset(
+            self.delete_text(
+                undo_action.offset,
                 undo_action.offset + undo_action.length
             )
-            self.text_buffer.delete(start, stop)
-            self.place_cursor(start)
+            self.place_cursor_at_offset(undo_action.offset)
         else:
-            start = self.text_buffer.get_iter_at_offset(undo_action.start)
-            stop = self.text_buffer.get_iter_at_offset(undo_action.end)
-            self.insert(start, undo_action.deleted_text)
+            self.insert_text(undo_action.start, undo_action.deleted_text)
             if undo_action.delete_key_used:
-                self.place_cursor(start)
+                self.place_cursor_at_offset(undo_action.start)
             else:
-                self.place_cursor(stop)
+                self.place_cursor_at_offset(undo_action.end)
         self.end_not_undoable_action()
         self.undo_in_progress = False
         self.modified = True
@@ -176,70 +329,60 @@ class UndoableBuffer(gtk.TextBuffer):
         """redo inserts or deletions
 
         redone actions are moved to undo stack"""
-        if not self.redo_stack:
+        if not self.history.can_redo:
             return
         self.begin_not_undoable_action()
         self.undo_in_progress = True
-        redo_action = self.redo_stack.pop()
-        self.undo_stack.append(redo_action)
+        redo_action = self.history.pop_redo()
         if isinstance(redo_action, UndoableInsert):
-            start = self.text_buffer.get_iter_at_offset(redo_action.offset)
-            self.insert(start, redo_action.text)
-            new_cursor_pos = self.text_buffer.get_iter_at_offset(
+            self.insert_text(redo_action.offset, redo_action.text)
+            self.place_cursor_at_offset(
                 redo_action.offset + redo_action.length
             )
-            self.place_cursor(new_cursor_pos)
         else:
-            start = self.text_buffer.get_iter_at_offset(redo_action.start)
-            stop = self.text_buffer.get_iter_at_offset(redo_action.end)
-            self.text_buffer.delete(start, stop)
-            self.place_cursor(start)
+            self.delete_text(redo_action.start, redo_action.end)
+            self.place_cursor_at_offset(redo_action.start)
         self.end_not_undoable_action()
         self.undo_in_progress = False
         self.modified = True
 
     def get_text_from_buffer(self):
-        return self.text_buffer.get_text(
-            self.text_buffer.get_start_iter(),
-            self.text_buffer.get_end_iter()
-        )
+        return self.document.get_text().encode('utf-8')
 
     def has_filename(self):
         return self.filename != FILE_UNNAMED
     def has_no_filename(self):
         return not self.has_filename()
 
+    def set_text(self, text):
+        if self._text_buffer is not None:
+            self._text_buffer.set_text(text)
+            return
+        self.delete_text(0, len(self.document))
+        self.insert_text(0, text)
+
+    def get_char_count(self):
+        return len(self.document)
+
+    def get_line_count(self):
+        return self.document.line_count
 
-    ## Passthrus until we can encapsulate TextBuffer fully
+    def get_word_count(self):
+        return self.statistics.words
+
+
+    ## Passthrus to the view for callers still working with iters
     def place_cursor(self, *args, **kwargs):
         self.text_buffer.place_cursor(*args, **kwargs)
 
-    def set_text(self, *args, **kwargs):
-        self.text_buffer.set_text(*args, **kwargs)
-
     def get_text(self, *args, **kwargs):
         return self.text_buffer.get_text(*args, **kwargs)
 
-    def get_end_iter(self, *args, **kwargs):
-        return self.text_buffer.get_end_iter(*args, **kwargs)
-
     def get_insert(self, *args, **kwargs):
         return self.text_buffer.get_insert(*args, **kwargs)
 
-    def get_char_count(self, *args, **kwargs):
-        return self.text_buffer.get_char_count(*args, **kwargs)
-
     def get_start_iter(self, *args, **kwargs):
         return self.text_buffer.get_start_iter(*args, **kwargs)
 
-    def get_line_count(self, *args, **kwargs):
-        return self.text_buffer.get_line_count(*args, **kwargs)
-
     def get_end_iter(self, *args, **kwargs):
         return self.text_buffer.get_end_iter(*args, **kwargs)
-
-
-
-
-
-
@@ -1,17 +1,50 @@
 class UndoableDelete(object):
-    """something that has ben deleted from our textbuffer"""
-    def __init__(self, text_buffer, start_iter, end_iter):
-        self.deleted_text = text_buffer.get_text(start_iter, end_iter)
-        self.start = start_iter.get_offset()
-        self.end = end_iter.get_offset()
+    """something that has ben deleted from our textbuffer
+
+    text removed with backspace is collected in head (newest last), text
+    removed with the delete key in tail; both are joined only on demand"""
+    __slots__ = ('head', 'tail', 'size', 'start', 'end', 'delete_key_used',
+                 'mergeable')
+
+    def __init__(self, start, end, deleted_text, cursor_offset):
+        self.head = []
+        self.tail = [deleted_text]
+        self.size = len(deleted_text)
+        self.start = start
+        self.end = end
         # need to find out if backspace or delete key has been used
         # so we don't mess up during redo
-        insert_iter = text_buffer.get_iter_at_mark(text_buffer.get_insert())
-        if insert_iter.get_offset() <= self.start:
+        if cursor_offset <= self.start:
             self.delete_key_used = True
         else:
             self.delete_key_used = False
-        if self.end - self.start > 1 or self.deleted_text in ("\r", "\n", " "):
+        if self.end - self.start > 1 or deleted_text in ("\r", "\n", " "):
             self.mergeable = False
         else:
             self.mergeable = True
+
+    @property
+    def deleted_text(self):
+        if self.head or len(self.tail) > 1:
+            self.head.reverse()
+            self.tail = [''.join(self.head + self.tail)]
+            self.head = []
+        return self.tail[0]
+
+    def text_is_one_of(self, choices):
+        """check whole text against choices without joining chunks"""
+        return not self.head and len(self.tail) == 1 and \
+            self.tail[0] in choices
+
+    def merge(self, other):
+        """merge a neighbouring deletion into this one"""
+        if self.start == other.start: # delete key used
+            self.tail.append(other.deleted_text)
+            self.end += (other.end - other.start)
+        else: # Backspace used
+            self.head.append(other.deleted_text)
+            self.start = other.start
+        self.size += other.size
+
+    def text_size(self):
+        return self.size
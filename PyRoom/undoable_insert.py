@@ -1,10 +1,35 @@
 class UndoableInsert(object):
-    """something that has been inserted into our textbuffer"""
-    def __init__(self, text_iter, text, length):
-        self.offset = text_iter.get_offset()
-        self.text = text
-        self.length = length
-        if self.length > 1 or self.text in ("\r", "\n", " "):
+    """something that has been inserted into our textbuffer
+
+    merged keystrokes are kept as separate chunks and only joined when the
+    text is actually needed, so typing stays cheap for long groups"""
+    __slots__ = ('offset', 'chunks', 'size', 'length', 'mergeable')
+
+    def __init__(self, offset, text):
+        self.offset = offset
+        self.chunks = [text]
+        self.size = len(text)
+        self.length = len(text)
+        if self.length > 1 or text in ("\r", "\n", " "):
             self.mergeable = False
         else:
             self.mergeable = True
+
+    @property
+    def text(self):
+        if len(self.chunks) > 1:
+            self.chunks = [''.join(self.chunks)]
+        return self.chunks[0]
+
+    def text_is_one_of(self, choices):
+        """check whole text against choices without joining chunks"""
+        return len(self.chunks) == 1 and self.chunks[0] in choices
+
+    def merge(self, other):
+        """append a following insert to this one"""
+        self.chunks.append(other.text)
+        self.size += other.size
+        self.length += other.length
+
+    def text_size(self):
+        return self.size
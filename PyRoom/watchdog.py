@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+
+"""
+log where the main loop got stuck
+
+A timeout in the main loop beats every half threshold. A thread checks the
+beat; when it has been silent for longer than the threshold, the thread
+takes the Python stack of the main thread, and once the main loop beats
+again it appends how long the beat was missing and that stack to the log.
+"""
+
+import sys
+import thread
+import threading
+import time
+import traceback
+
+import gobject
+
+DEFAULT_THRESHOLD = 0.05
+
+
+class Watchdog(object):
+
+    def __init__(self, log_filename, threshold=DEFAULT_THRESHOLD):
+        self.log_filename = log_filename
+        self.threshold = threshold
+        self.interval = threshold / 2
+        self.main_thread_id = None
+        self.last_beat = None
+        self.beat_id = 0
+        self.thread = None
+        self.stopping = False
+
+    def start(self):
+        """start watching, call this from the thread running the main loop"""
+        gobject.threads_init()
+        self.main_thread_id = thread.get_ident()
+        self.last_beat = time.time()
+        self.stopping = False
+        self.beat_id = gobject.timeout_add(
+            max(1, int(self.interval * 1000)), self._beat
+        )
+        self.thread = threading.Thread(target=self._watch)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def stop(self):
+        if self.beat_id:
+            gobject.source_remove(self.beat_id)
+            self.beat_id = 0
+        self.stopping = True
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _beat(self):
+        self.last_beat = time.time()
+        return True
+
+    def _watch(self):
+        stalled_beat = None
+        stack = None
+        while not self.stopping:
+            time.sleep(self.interval)
+            last_beat = self.last_beat
+            if time.time() - last_beat > self.threshold:
+                if stalled_beat != last_beat:
+                    stalled_beat = last_beat
+                    stack = self._main_thread_stack()
+            elif stalled_beat is not None:
+                self._log(last_beat - stalled_beat, stack)
+                stalled_beat = None
+
+    def _main_thread_stack(self):
+        frame = sys._current_frames().get(self.main_thread_id)
+        if frame is None:
+            return ''
+        return ''.join(traceback.format_stack(frame))
+
+    def _log(self, duration, stack):
+        log = open(self.log_filename, 'a')
+        try:
+            log.write('%s main loop stalled for %.3fs\n%s\n' % (
+                time.strftime('%Y-%m-%d %H:%M:%S'), duration, stack
+            ))
+        finally:
+            log.close()
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+headless benchmarks of the editor
+
+drives Editor and UndoableBuffer without a display, through MockGUI and
+MockPreferences, and writes the timings as JSON so runs can be compared:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --max-size 1048576
+
+a trace recorded with pyroom --record-keys is replayed as one more benchmark
+when given with --trace.
+"""
+
+import os
+import sys
+sys.path.append('../PyRoom')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# mock out gettext
+import __builtin__
+__builtin__._ = lambda str: str
+
+import json
+import platform
+import shutil
+import tempfile
+from optparse import OptionParser
+from timeit import default_timer
+
+import gobject
+
+import PyRoom
+from PyRoom import key_trace
+from PyRoom.factory import Factory
+from PyRoom.preferences import PyroomConfig
+from PyRoom.session import FileStoreSession
+
+FILE_SIZES = (1024, 1024 * 1024, 100 * 1024 * 1024)
+TYPED_CHARACTERS = 20000
+UNDO_STEPS = 10000
+SESSION_FILES = (1, 10, 100)
+
+LINE = u'All work and no play makes Jack a dull boy. æøå\n'
+
+
+class Benchmarks(object):
+
+    def __init__(self, directory, file_sizes, session_files, traces=()):
+        self.directory = directory
+        self.file_sizes = file_sizes
+        self.session_files = session_files
+        self.traces = traces
+        self.factory = Factory()
+        self.results = []
+
+    def run(self):
+        self.bench_typing()
+        self.bench_undo_and_redo()
+        for size in self.file_sizes:
+            self.bench_open_and_save(size)
+        for count in self.session_files:
+            self.bench_session_restore(count)
+        for filename in self.traces:
+            self.bench_trace(filename)
+        return self.results
+
+    def record(self, name, seconds, **parameters):
+        result = dict(parameters)
+        result.update({'name': name, 'seconds': seconds})
+        self.results.append(result)
+        sys.stderr.write('%-24s %10.4fs %s\n' % (
+            name, seconds, ' '.join('%s=%s' % item
+                                    for item in sorted(parameters.items()))
+        ))
+
+    def bench_typing(self):
+        buf = self.create_editor().get_current_buffer()
+        started = default_timer()
+        for index in xrange(TYPED_CHARACTERS):
+            buf.insert_text(buf.get_cursor_offset(), LINE[index % len(LINE)])
+        seconds = default_timer() - started
+        self.record(
+            'typing', seconds, characters=TYPED_CHARACTERS,
+            characters_per_second=TYPED_CHARACTERS / max(seconds, 1e-9)
+        )
+
+    def bench_undo_and_redo(self):
+        buf = self.create_editor().get_current_buffer()
+        # a word and a space never merge, so every insert is a step
+        for step in xrange(UNDO_STEPS / 2):
+            buf.insert_text(buf.get_cursor_offset(), u'word')
+            buf.insert_text(buf.get_cursor_offset(), u' ')
+        steps = 0
+        started = default_timer()
+        while buf.can_undo:
+            buf.undo()
+            steps += 1
+        self.record('undo', default_timer() - started, steps=steps)
+        steps = 0
+        started = default_timer()
+        while buf.can_redo:
+            buf.redo()
+            steps += 1
+        self.record('redo', default_timer() - started, steps=steps)
+
+    def bench_trace(self, filename):
+        events = list(key_trace.read_trace(filename))
+        editor = self.create_editor()
+        started = default_timer()
+        key_trace.replay(editor, events)
+        self.record('replay', default_timer() - started,
+                    trace=os.path.basename(filename), events=len(events))
+
+    def bench_open_and_save(self, size):
+        filename = os.path.join(self.directory, 'document-%d.txt' % size)
+        write_document(filename, size)
+        editor = self.create_editor()
+
+        started = default_timer()
+        editor.open_file(filename)
+        buf = editor.get_current_buffer()
+        context = gobject.main_context_default()
+        while buf.is_loading:
+            context.iteration(True)
+        self.record('open_file', default_timer() - started, bytes=size,
+                    read_only=buf.is_read_only)
+
+        started = default_timer()
+        editor.word_count(buf)
+        self.record('word_count', default_timer() - started, bytes=size)
+
+        if not buf.is_read_only:
+            self.bench_save(editor, buf, size)
+        os.remove(filename)
+
+    def bench_save(self, editor, buf, size):
+        buf.insert_text(0, u'changed ')
+        started = default_timer()
+        editor.save_file_to_disk()
+        returned = default_timer()
+        editor.save_worker.wait()
+        finished = default_timer()
+        # the editor hands the text to the save worker and returns
+        self.record('save_file_to_disk', returned - started, bytes=size)
+        self.record('save_file_written', finished - started, bytes=size)
+
+    def bench_session_restore(self, count):
+        session_filepath = os.path.join(self.directory, 'pyroom.session')
+        session = FileStoreSession(session_filepath)
+        for index in range(count):
+            filename = os.path.join(self.directory, 'session-%d.txt' % index)
+            write_document(filename, 64 * 1024)
+            session.add_open_filename(filename)
+        session.flush()
+
+        pyroom_config = PyroomConfig()
+        pyroom_config.set('session', 'private', '0')
+        pyroom_config.set('session', 'filepath', session_filepath)
+        started = default_timer()
+        editor = self.factory.create_new_headless_editor(pyroom_config)
+        self.record('session_restore', default_timer() - started,
+                    files=len(editor.buffers))
+
+        os.remove(session_filepath)
+        for index in range(count):
+            os.remove(os.path.join(self.directory, 'session-%d.txt' % index))
+
+    def create_editor(self):
+        pyroom_config = PyroomConfig()
+        pyroom_config.set('session', 'private', '1')
+        return self.factory.create_new_headless_editor(pyroom_config)
+
+
+def write_document(filename, size):
+    line = LINE.encode('utf-8')
+    document = open(filename, 'wb')
+    try:
+        for written in xrange(0, size - len(line) + 1, len(line)):
+            document.write(line)
+        document.write('x' * (size % len(line)))
+    finally:
+        document.close()
+
+
+def main():
+    parser = OptionParser(
+        usage='%prog [--output FILE] [--max-size BYTES] [--trace FILE]...'
+    )
+    parser.add_option('-o', '--output', dest='output', default='-',
+                      metavar='FILE',
+                      help='write the results to FILE as JSON, - for stdout')
+    parser.add_option('--max-size', dest='max_size', type='int',
+                      default=max(FILE_SIZES), metavar='BYTES',
+                      help='skip documents bigger than BYTES')
+    parser.add_option('--trace', dest='traces', action='append', default=[],
+                      metavar='FILE',
+                      help='replay a trace recorded with --record-keys')
+    (options, args) = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='pyroom-benchmark-')
+    try:
+        results = Benchmarks(
+            directory,
+            [size for size in FILE_SIZES if size <= options.max_size],
+            SESSION_FILES,
+            options.traces
+        ).run()
+    finally:
+        shutil.rmtree(directory)
+
+    report = json.dumps({
+        'pyroom': PyRoom.__VERSION__,
+        'python': platform.python_version(),
+        'benchmarks': results,
+    }, indent=2, sort_keys=True)
+    if options.output == '-':
+        sys.stdout.write(report + '\n')
+    else:
+        output = open(options.output, 'w')
+        try:
+            output.write(report + '\n')
+        finally:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+from unittest import TestCase
+
+import errno
+import os
+import sys
+sys.path.append('../PyRoom')
+
+import shutil
+import tempfile
+
+# mock out gettext
+import __builtin__
+__builtin__._ = lambda str: str
+
+from PyRoom import atomic_file
+from PyRoom.atomic_file import write_atomically
+
+
+class TestAtomicFileAcceptance(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.directory, 'document.txt')
+        with open(self.filepath, 'wb') as test_file:
+            test_file.write('old text')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_new_text_replaces_the_file_through_a_rename(self):
+        old_inode = os.stat(self.filepath).st_ino
+
+        write_atomically(self.filepath, ['new ', 'text'])
+
+        self.assertEquals('new text', self._read())
+        self.assertNotEquals(old_inode, os.stat(self.filepath).st_ino)
+        self.assertEquals(['document.txt'], os.listdir(self.directory))
+
+    def test_mode_and_ownership_are_kept(self):
+        os.chmod(self.filepath, 0640)
+        if os.getuid() == 0:
+            os.chown(self.filepath, 4321, 4321)
+        original = os.stat(self.filepath)
+
+        write_atomically(self.filepath, ['new text'])
+
+        replaced = os.stat(self.filepath)
+        self.assertEquals(0640, replaced.st_mode & 07777)
+        self.assertEquals(original.st_uid, replaced.st_uid)
+        self.assertEquals(original.st_gid, replaced.st_gid)
+
+    def test_failed_write_keeps_the_file_and_removes_the_temporary_one(self):
+        def chunks():
+            yield 'half of the'
+            raise IOError(errno.ENOSPC, 'No space left on device')
+
+        self.assertRaises(IOError, write_atomically, self.filepath, chunks())
+
+        self.assertEquals('old text', self._read())
+        self.assertEquals(['document.txt'], os.listdir(self.directory))
+
+    def test_file_is_overwritten_in_place_if_the_directory_is_read_only(self):
+        old_inode = os.stat(self.filepath).st_ino
+        mkstemp = atomic_file.tempfile.mkstemp
+
+        def refuse(*args, **kwargs):
+            raise OSError(errno.EACCES, 'Permission denied')
+        atomic_file.tempfile.mkstemp = refuse
+        try:
+            write_atomically(self.filepath, ['new text'])
+        finally:
+            atomic_file.tempfile.mkstemp = mkstemp
+
+        self.assertEquals('new text', self._read())
+        self.assertEquals(old_inode, os.stat(self.filepath).st_ino)
+
+    def _read(self):
+        with open(self.filepath, 'rb') as test_file:
+            return test_file.read()
@@ -45,6 +45,7 @@ class TestAutosaveAcceptance(TestCase):
 
         self._trick_editor_into_thinking_time_has_passed(self.editor, self.autosave_time)
         autosave.autosave_timeout(self.editor)
+        self.editor.save_worker.wait()
 
         self.assertTrue(os.path.isfile(expected_autosave_filepath))
         with open(expected_autosave_filepath) as autosave_file:
@@ -64,9 +65,62 @@ class TestAutosaveAcceptance(TestCase):
 
         self.assertTrue(self.editor.gui.user_wants_to_restore_backup.was_called)
 
+    def test_restoring_a_backup_replays_the_edits_journaled_after_it(self):
+        filepath = self._generate_temporary_filepath()
+        buf = self.editor.get_current_buffer()
+        buf.filename = filepath
+        buf.insert_text(0, u'first draft')
+        autosave.autosave(self.editor)
+        buf.insert_text(0, u'a ')
+        buf.delete_text(2, 8)
+        autosave.autosave(self.editor)
+        self.editor.save_worker.wait()
+        checkpoint_filepath, journal_filepath = \
+            autosave.get_backup_filenames(filepath)
+        with open(checkpoint_filepath) as checkpoint_file:
+            self.assertEquals(checkpoint_file.read(), 'first draft')
+
+        restoring_editor = self.factory.create_new_editor(self.pyroom_config)
+        restoring_editor.gui.user_wants_to_restore_backup = lambda: True
+        restoring_editor.open_file(filepath)
+
+        self.assertEquals(
+            restoring_editor.get_current_buffer().get_text_from_buffer(),
+            'a draft'
+        )
+        for backup_filepath in (checkpoint_filepath, journal_filepath):
+            os.remove(backup_filepath)
+
+    def test_edits_are_not_kept_when_autosave_is_off(self):
+        editor = self.factory.create_new_headless_editor(self.pyroom_config)
+        editor.preferences.autosave_time = 0
+        buf = editor.get_current_buffer()
+        buf.filename = self._generate_temporary_filepath()
+
+        editor_input.type_keys('typed while autosave is off', editor)
+
+        self.assertEquals([], autosave.get_backup_state(editor, buf).edits)
+
+    def test_too_many_pending_edits_are_replaced_by_a_checkpoint(self):
+        editor = self.factory.create_new_headless_editor(self.pyroom_config)
+        buf = editor.get_current_buffer()
+        buf.filename = self._generate_temporary_filepath()
+        buf.insert_text(0, u'first draft')
+        autosave.autosave(editor)
+        editor.save_worker.wait()
+
+        buf.insert_text(0, u'x' * (autosave.MAX_PENDING_EDITS_SIZE + 1))
+
+        state = autosave.get_backup_state(editor, buf)
+        self.assertEquals([], state.edits)
+        self.assertTrue(state.needs_checkpoint)
+        for backup_filepath in autosave.get_backup_filenames(buf.filename):
+            os.remove(backup_filepath)
+
     def _trick_editor_into_thinking_time_has_passed(self, editor, autosave_time):
-        enough_elapsed_time_counter = 60 * autosave_time
-        editor.autosave_elapsed = enough_elapsed_time_counter
+        enough_elapsed_time = 60 * autosave_time
+        editor.autosave_first_change -= enough_elapsed_time
+        editor.autosave_last_change -= enough_elapsed_time
 
     def _generate_temporary_filepath(self):
         import tempfile
@@ -14,6 +14,9 @@ import uuid
 
 from PyRoom.preferences import PyroomConfigFileBuilderAndReader
 from PyRoom.preferences import PyroomConfig
+from PyRoom.preferences import Preferences
+from PyRoom.gui import MockGUI
+from spy import spy
 
 class TestConfigurationAcceptanceTest(TestCase):
     
@@ -45,3 +48,34 @@ class TestConfigurationAcceptanceTest(TestCase):
         return file_contents
 
 
+
+
+class TestFontAcceptanceTest(TestCase):
+
+    def setUp(self):
+        self.pyroom_config = PyroomConfig()
+        self.gui = MockGUI()
+        self.gui.textbox.modify_font = spy()
+
+    def test_custom_font_is_set_right_away_without_asking_gconf(self):
+        self.pyroom_config.set('visual', 'use_font_type', 'custom')
+        Preferences.get_gnome_fonts = spy()
+        try:
+            Preferences(self.gui, self.pyroom_config)
+        finally:
+            del Preferences.get_gnome_fonts
+
+        self.assertTrue(self.gui.textbox.modify_font.was_called)
+
+    def test_desktop_font_is_asked_for_once_startup_is_done(self):
+        self.pyroom_config.set('visual', 'use_font_type', 'document')
+        Preferences.get_gnome_fonts = spy()
+        try:
+            preferences = Preferences(self.gui, self.pyroom_config)
+            self.assertFalse(Preferences.get_gnome_fonts.was_called)
+
+            preferences.set_desktop_font()
+            self.assertTrue(Preferences.get_gnome_fonts.was_called)
+        finally:
+            del Preferences.get_gnome_fonts
+        self.assertTrue(self.gui.textbox.modify_font.was_called)
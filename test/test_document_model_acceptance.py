@@ -0,0 +1,241 @@
+from unittest import TestCase
+
+import sys
+sys.path.append('../PyRoom')
+
+# mock out gettext
+import __builtin__
+__builtin__._ = lambda str: str
+
+import random
+
+from PyRoom.piece_table import PieceTable
+from PyRoom.undoable_buffer import UndoableBuffer
+from PyRoom.undoable_delete import UndoableDelete
+from PyRoom.undoable_insert import UndoableInsert
+from PyRoom.text_statistics import count_words
+
+
+class TestPieceTableAcceptance(TestCase):
+
+    def test_edits_match_plain_string_edits(self):
+        randomizer = random.Random(42)
+        document = PieceTable(u'some text\nthat was loaded')
+        expected = u'some text\nthat was loaded'
+        for step in range(2000):
+            if expected and randomizer.random() < 0.4:
+                start = randomizer.randrange(len(expected))
+                end = min(len(expected), start + randomizer.randrange(10))
+                document.delete(start, end)
+                expected = expected[:start] + expected[end:]
+            else:
+                offset = randomizer.randrange(len(expected) + 1)
+                text = randomizer.choice([u'a', u' ', u'\n', u'word '])
+                document.insert(offset, text)
+                expected = expected[:offset] + text + expected[offset:]
+
+        self.assertEquals(document.get_text(), expected)
+        self.assertEquals(len(document), len(expected))
+        self.assertEquals(document.line_count, expected.count(u'\n') + 1)
+
+    def test_can_read_a_slice(self):
+        document = PieceTable(u'Hello World')
+        document.insert(5, u',')
+
+        self.assertEquals(document.get_slice(3, 8), u'lo, W')
+
+    def test_snapshot_is_not_affected_by_later_edits(self):
+        document = PieceTable(u'first draft')
+        snapshot = document.snapshot()
+        document.delete(0, 6)
+
+        self.assertEquals(snapshot.get_text(), u'first draft')
+        self.assertEquals(document.get_text(), u'draft')
+
+    def test_typed_characters_are_added_to_one_piece(self):
+        document = PieceTable(u'loaded\n')
+        for character in u'typed a word\n':
+            document.insert(len(document), character)
+        snapshot = document.snapshot()
+        document.insert(len(document), u'more')
+
+        self.assertEquals(document.get_text(), u'loaded\ntyped a word\nmore')
+        self.assertEquals(document.line_count, 3)
+        self.assertEquals(document.root.size, document.root.length)
+        self.assertEquals(snapshot.get_text(), u'loaded\ntyped a word\n')
+
+    def test_utf8_input_is_stored_by_character(self):
+        document = PieceTable('caf\xc3\xa9')
+
+        self.assertEquals(len(document), 4)
+
+
+class TestHeadlessBufferAcceptance(TestCase):
+
+    def setUp(self):
+        self.buffer = UndoableBuffer()
+
+    def _type(self, text):
+        for char in text:
+            self.buffer.insert_text(self.buffer.get_cursor_offset(), char)
+
+    def test_typing_without_a_view_never_creates_one(self):
+        self._type('Hello')
+
+        self.assertEquals(self.buffer.get_text_from_buffer(), 'Hello')
+        self.assertFalse(self.buffer.has_view)
+
+    def test_typed_word_is_undone_and_redone_at_once(self):
+        self._type('Hello')
+        self.buffer.undo()
+
+        self.assertEquals(self.buffer.get_text_from_buffer(), '')
+
+        self.buffer.redo()
+
+        self.assertEquals(self.buffer.get_text_from_buffer(), 'Hello')
+
+    def test_backspacing_is_undone_in_one_step(self):
+        self._type('Hello World')
+        for count in range(5):
+            cursor = self.buffer.get_cursor_offset()
+            self.buffer.delete_text(cursor - 1, cursor)
+
+        self.assertEquals(self.buffer.get_text_from_buffer(), 'Hello ')
+
+        self.buffer.undo()
+
+        self.assertEquals(self.buffer.get_text_from_buffer(), 'Hello World')
+        self.assertEquals(self.buffer.get_cursor_offset(), 11)
+
+    def test_set_text_is_not_undoable_when_asked(self):
+        self.buffer.begin_not_undoable_action()
+        self.buffer.set_text('loaded from disk')
+        self.buffer.end_not_undoable_action()
+
+        self.assertFalse(self.buffer.can_undo)
+        self.assertEquals(self.buffer.get_line_count(), 1)
+        self.assertEquals(self.buffer.get_char_count(), 16)
+        self.assertFalse(self.buffer.modified)
+
+    def test_first_keystroke_marks_the_buffer_modified(self):
+        self._type('a')
+
+        self.assertTrue(self.buffer.modified)
+
+    def test_first_deletion_marks_the_buffer_modified(self):
+        self.buffer.begin_not_undoable_action()
+        self.buffer.set_text('loaded from disk')
+        self.buffer.end_not_undoable_action()
+
+        self.buffer.delete_text(15, 16)
+
+        self.assertTrue(self.buffer.modified)
+
+
+class TestMergedActionsAcceptance(TestCase):
+
+    def test_backspaced_characters_are_kept_in_text_order(self):
+        deletion = UndoableDelete(4, 5, u'd', 5)
+        deletion.merge(UndoableDelete(3, 4, u'c', 4))
+        deletion.merge(UndoableDelete(2, 3, u'b', 3))
+
+        self.assertFalse(deletion.delete_key_used)
+        self.assertEquals(deletion.deleted_text, u'bcd')
+        self.assertEquals((deletion.start, deletion.end), (2, 5))
+        self.assertEquals(deletion.text_size(), 3)
+
+    def test_characters_removed_with_the_delete_key_are_appended(self):
+        deletion = UndoableDelete(2, 3, u'b', 2)
+        deletion.merge(UndoableDelete(2, 3, u'c', 2))
+        deletion.merge(UndoableDelete(2, 3, u'd', 2))
+
+        self.assertTrue(deletion.delete_key_used)
+        self.assertEquals(deletion.deleted_text, u'bcd')
+        self.assertEquals((deletion.start, deletion.end), (2, 5))
+
+    def test_merged_inserts_are_joined_in_order(self):
+        insertion = UndoableInsert(0, u'a')
+        insertion.merge(UndoableInsert(1, u'b'))
+        insertion.merge(UndoableInsert(2, u'c'))
+
+        self.assertEquals(insertion.text, u'abc')
+        self.assertEquals(insertion.length, 3)
+
+    def test_only_single_chunks_are_one_of_the_choices(self):
+        whitespace = (u' ', u'\t')
+        space = UndoableDelete(0, 1, u' ', 1)
+        letter = UndoableDelete(0, 1, u'a', 1)
+        self.assertTrue(space.text_is_one_of(whitespace))
+        self.assertFalse(letter.text_is_one_of(whitespace))
+        self.assertTrue(UndoableInsert(0, u'\t').text_is_one_of(whitespace))
+
+        backspaced = UndoableDelete(1, 2, u' ', 2)
+        backspaced.merge(UndoableDelete(0, 1, u' ', 1))
+        deleted = UndoableDelete(0, 1, u' ', 0)
+        deleted.merge(UndoableDelete(0, 1, u' ', 0))
+        inserted = UndoableInsert(0, u' ')
+        inserted.merge(UndoableInsert(1, u' '))
+        for action in (backspaced, deleted, inserted):
+            self.assertFalse(action.text_is_one_of(whitespace))
+
+
+class TestWordCountAcceptance(TestCase):
+
+    def test_counts_runs_of_letters_and_digits(self):
+        self.assertEquals(count_words(u'Hello, World! 42 times -- ok?'), 5)
+
+    def test_words_are_split_like_gtk_word_iterators_split_them(self):
+        # what counting forward_word_end steps gives with Pango
+        self.assertEquals(count_words(u'snake_case'), 2)
+        self.assertEquals(count_words(u"don't"), 2)
+        self.assertEquals(count_words(u'route66'), 2)
+        self.assertEquals(count_words(u'x\xb2'), 2)
+        self.assertEquals(count_words(u'cafe\u0301 au lait'), 3)
+        self.assertEquals(
+            count_words(u'\u0928\u092e\u0938\u094d\u0924\u0947'), 1
+        )
+        self.assertEquals(count_words(u'\u0301 alone'), 1)
+
+    def test_incremental_count_matches_full_scan_around_marks(self):
+        randomizer = random.Random(11)
+        buffer = UndoableBuffer()
+        for step in range(1000):
+            length = buffer.get_char_count()
+            if length and randomizer.random() < 0.3:
+                start = randomizer.randrange(length)
+                end = min(length, start + randomizer.randrange(1, 4))
+                buffer.delete_text(start, end)
+            else:
+                buffer.insert_text(
+                    randomizer.randrange(length + 1),
+                    randomizer.choice([u'a', u'1', u' ', u'_', u"'",
+                                       u'\u0301', u'\u0301\u0301'])
+                )
+
+        self.assertEquals(
+            buffer.get_word_count(),
+            count_words(buffer.document.get_text())
+        )
+
+    def test_incremental_count_matches_full_scan(self):
+        randomizer = random.Random(7)
+        buffer = UndoableBuffer()
+        for step in range(1000):
+            length = buffer.get_char_count()
+            if length and randomizer.random() < 0.3:
+                start = randomizer.randrange(length)
+                end = min(length, start + randomizer.randrange(1, 8))
+                buffer.delete_text(start, end)
+            else:
+                buffer.insert_text(
+                    randomizer.randrange(length + 1),
+                    randomizer.choice([u'a', u'b', u' ', u'\n', u'.', u'x y'])
+                )
+            if randomizer.random() < 0.05:
+                buffer.undo()
+
+        self.assertEquals(
+            buffer.get_word_count(),
+            count_words(buffer.document.get_text())
+        )
@@ -1,14 +1,20 @@
 from unittest import TestCase
 
+import os
 import sys
 sys.path.append('../PyRoom')
 
+import shutil
+import tempfile
+
 # mock out gettext
 import __builtin__
 __builtin__._ = lambda str: str
 
 
 import editor_input
+from spy import spy
+from PyRoom import autosave
 from PyRoom.factory import Factory
 from PyRoom.preferences import PyroomConfig
 from PyRoom.session import PrivateSession
@@ -71,6 +77,7 @@ class TestBasicEditAcceptance(TestCase):
         test_file_path = '/tmp/pyroom.unittest.test_file'
         buffer.filename = test_file_path
         editor.save_file_to_disk()
+        editor.save_worker.wait()
 
         with open(test_file_path) as test_file:
             actual_test_file_contents = test_file.read()
@@ -80,12 +87,146 @@ class TestBasicEditAcceptance(TestCase):
             actual_test_file_contents
         )
 
+    def test_buffer_whose_save_failed_is_not_closed(self):
+        editor = self._create_headless_editor()
+        editor.new_buffer()
+        editor_input.type_keys('words that must not be lost', editor)
+        buffer = editor.get_current_buffer()
+        buffer.filename = '/nonexistent-directory/pyroom.unittest.test_file'
+        editor.gui.close_buffer_dialog.hide = spy()
+
+        editor.close_buffer_save_button_handler(None)
+
+        self.assertTrue(buffer in editor.buffers)
+
+    def test_editor_does_not_quit_when_a_save_failed(self):
+        editor = self._create_headless_editor()
+        editor_input.type_keys('words that must not be lost', editor)
+        editor.get_current_buffer().filename = \
+            '/nonexistent-directory/pyroom.unittest.test_file'
+        editor.gui.quit = spy()
+
+        editor.save_file_to_disk()
+        editor.quit()
+
+        self.assertFalse(editor.gui.quit.was_called)
+
+    def test_editor_quits_without_saving_when_asked_after_a_failed_save(self):
+        editor = self._create_headless_editor()
+        editor_input.type_keys('words the user gave up on', editor)
+        editor.get_current_buffer().filename = \
+            '/nonexistent-directory/pyroom.unittest.test_file'
+        editor.gui.quit = spy()
+        editor.gui.quitdialog.hide = spy()
+
+        editor.save_file_to_disk()
+        editor.quit_dialog_close_button_handler(None)
+
+        self.assertTrue(editor.gui.quit.was_called)
+
+    def test_quit_dialog_saves_every_modified_buffer(self):
+        editor = self._create_headless_editor()
+        editor.gui.quit = spy()
+        editor.gui.quitdialog.hide = spy()
+        test_file_paths = []
+        for index in range(2):
+            editor.new_buffer()
+            editor.set_buffer(len(editor.buffers) - 1)
+            editor_input.type_keys('text %d' % index, editor)
+            test_file_path = '/tmp/pyroom.unittest.test_file.%d' % index
+            editor.get_current_buffer().filename = test_file_path
+            test_file_paths.append(test_file_path)
+
+        editor.quit_dialog_save_button_handler(None)
+
+        try:
+            for index, test_file_path in enumerate(test_file_paths):
+                with open(test_file_path) as test_file:
+                    self.assertEquals('text %d' % index, test_file.read())
+        finally:
+            for test_file_path in test_file_paths:
+                if os.path.isfile(test_file_path):
+                    os.remove(test_file_path)
+        self.assertTrue(editor.gui.quit.was_called)
+
+    def test_closing_the_last_buffer_quits_the_editor(self):
+        editor = self._create_headless_editor()
+        editor.gui.quit = spy()
+
+        editor.close_current_buffer()
+
+        self.assertTrue(editor.gui.quit.was_called)
+
     def test_first_opened_buffer_is_unnamed(self):
         editor = self._create_private_session_editor()
         self.assertFalse(editor.get_current_buffer().has_filename())
 
+    def _create_headless_editor(self):
+        pyroom_config = PyroomConfig()
+        pyroom_config.set('session', 'private', '1')
+        return self.factory.create_new_headless_editor(pyroom_config)
+
     def _create_private_session_editor(self):
         pyroom_config = PyroomConfig()
         pyroom_config.set('session', 'private', '1')
         return self.factory.create_new_editor(pyroom_config)
 
+
+class TestPlaceholderBufferAcceptance(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        pyroom_config = PyroomConfig()
+        pyroom_config.set('session', 'private', '1')
+        self.editor = Factory().create_new_headless_editor(pyroom_config)
+        self.buffers = []
+        for name in ('first', 'second', 'third', 'fourth'):
+            filename = os.path.join(self.directory, name)
+            with open(filename, 'w') as test_file:
+                test_file.write('text of the %s file' % name)
+            self.buffers.append(self.editor.add_placeholder_buffer(filename))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_buffer_stays_a_placeholder_until_it_is_shown(self):
+        third = self.buffers[2]
+        self.assertTrue(third.placeholder)
+        self.assertEquals('', third.get_text_from_buffer())
+
+        self.editor.set_buffer(self.editor.buffers.index(third))
+
+        self.assertFalse(third.placeholder)
+        self.assertEquals(
+            'text of the third file', third.get_text_from_buffer()
+        )
+        for buf in self.buffers[:2] + self.buffers[3:]:
+            self.assertTrue(buf.placeholder)
+
+    def test_buffers_next_to_the_shown_one_are_prefetched(self):
+        first, second, third, fourth = self.buffers
+        self.editor.set_buffer(self.editor.buffers.index(third))
+
+        while self.editor.prefetch_neighbours():
+            pass
+
+        self.assertFalse(second.placeholder)
+        self.assertEquals(
+            'text of the second file', second.get_text_from_buffer()
+        )
+        self.assertFalse(fourth.placeholder)
+        self.assertTrue(first.placeholder)
+        self.assertEquals(0, self.editor.prefetch_id)
+
+    def test_buffer_with_an_autosave_backup_is_not_prefetched(self):
+        second, third = self.buffers[1:3]
+        backup_filename = autosave.get_autosave_filename(second.filename)
+        with open(backup_filename, 'w') as backup_file:
+            backup_file.write('text that was never saved')
+        self.editor.set_buffer(self.editor.buffers.index(third))
+
+        while self.editor.prefetch_neighbours():
+            pass
+
+        self.assertTrue(second.placeholder)
+        self.assertFalse(self.buffers[3].placeholder)
@@ -0,0 +1,138 @@
+from unittest import TestCase
+
+import os
+import sys
+sys.path.append('../PyRoom')
+
+import tempfile
+
+# mock out gettext
+import __builtin__
+__builtin__._ = lambda str: str
+
+from PyRoom import file_loader
+from PyRoom.file_loader import BufferLoader
+from PyRoom.gui import MockGUI
+from PyRoom.pyroom_error import PyroomError
+from PyRoom.undoable_buffer import UndoableBuffer
+
+
+class TestBufferLoaderAcceptance(TestCase):
+
+    def setUp(self):
+        self.filepath = tempfile.mktemp()
+        self.chunk_size = file_loader.CHUNK_SIZE
+        file_loader.CHUNK_SIZE = 4
+        self.gui = MockGUI()
+        self.messages = []
+        self.gui.tell_user = self.messages.append
+        self.buf = UndoableBuffer()
+
+    def tearDown(self):
+        file_loader.CHUNK_SIZE = self.chunk_size
+        if os.path.isfile(self.filepath):
+            os.remove(self.filepath)
+
+    def test_characters_split_across_chunks_are_loaded_whole(self):
+        # the first chunk ends in the middle of the two bytes of the e acute
+        self._write(u'caf\xe9 \xe6\xf8\xe5'.encode('utf-8'))
+        BufferLoader(self.buf, self.filepath, self.gui).run()
+
+        self.assertEquals(self.buf.document.get_text(),
+                          u'caf\xe9 \xe6\xf8\xe5')
+
+    def test_buffer_is_not_editable_while_loading(self):
+        self._write('some text')
+        loader = BufferLoader(self.buf, self.filepath, self.gui)
+
+        self.assertTrue(self.buf.is_loading)
+        self.assertFalse(self.buf.editable)
+        loader.run()
+        self.assertFalse(self.buf.is_loading)
+        self.assertTrue(self.buf.editable)
+        self.assertFalse(self.buf.modified)
+        self.assertFalse(self.buf.can_undo)
+
+    def test_invalid_utf8_stops_loading(self):
+        self._write('valid text, then \xff')
+        self.buf.filename = self.filepath
+        failed = []
+        loader = BufferLoader(self.buf, self.filepath, self.gui,
+                              on_failed=failed.append)
+
+        self.assertRaises(UnicodeDecodeError, loader.run)
+        self.assertFalse(self.buf.is_loading)
+        self.assertTrue(loader.source_file.closed)
+        self.assertEquals(failed, [self.buf])
+        self._assert_truncated_text_cannot_be_saved()
+
+    def test_invalid_utf8_in_an_idle_load_is_reported(self):
+        self._write('valid text, then \xff\xfe not utf-8')
+        self.buf.filename = self.filepath
+        loader = BufferLoader(self.buf, self.filepath, self.gui)
+        loader.start()
+
+        self.assertRaises(PyroomError, self._load_from_idle, loader)
+        self.assertFalse(self.buf.is_loading)
+        self.assertEquals(loader.idle_id, 0)
+        self._assert_truncated_text_cannot_be_saved()
+
+    def test_view_is_attached_only_once_loading_is_done(self):
+        self._write('some text')
+        self.buf.attach_view()
+        loader = BufferLoader(self.buf, self.filepath, self.gui)
+
+        self.assertFalse(self.buf.has_view)
+        loader.run()
+        self.assertEquals(self.buf.get_text_from_buffer(), 'some text')
+        self.assertEquals(
+            self.buf.text_buffer.get_text(*self.buf.text_buffer.get_bounds()),
+            'some text'
+        )
+
+    def test_cancelled_load_keeps_what_was_read(self):
+        self._write('first chunk and the rest')
+        finished = []
+        loader = BufferLoader(self.buf, self.filepath, self.gui,
+                              finished.append)
+        loader.start()
+        self.assertTrue(loader._idle_load())
+        loader.cancel()
+
+        self.assertEquals(self.buf.get_text_from_buffer(), 'firs')
+        self.assertFalse(self.buf.is_loading)
+        self.assertTrue(self.buf.editable)
+        self.assertEquals(loader.idle_id, 0)
+        self.assertEquals(finished, [])
+        self.assertEquals(self.messages[-1],
+                          'Stopped loading %s' % self.filepath)
+
+    def test_idle_load_reports_when_the_file_is_open(self):
+        self._write('short')
+        finished = []
+        loader = BufferLoader(self.buf, self.filepath, self.gui,
+                              finished.append)
+        loader.start()
+        while loader._idle_load():
+            pass
+
+        self.assertEquals(self.buf.get_text_from_buffer(), 'short')
+        self.assertEquals(finished, [self.buf])
+        self.assertFalse(self.buf.is_loading)
+        self.assertEquals(self.messages[-1], 'File %s open' % self.filepath)
+
+    def _load_from_idle(self, loader):
+        while loader._idle_load():
+            pass
+
+    def _assert_truncated_text_cannot_be_saved(self):
+        self.assertEquals(self.buf.get_text_from_buffer(), '')
+        self.assertFalse(self.buf.has_filename())
+        self.assertFalse(self.buf.modified)
+
+    def _write(self, data):
+        test_file = open(self.filepath, 'wb')
+        try:
+            test_file.write(data)
+        finally:
+            test_file.close()
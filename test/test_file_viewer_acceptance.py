@@ -0,0 +1,109 @@
+from unittest import TestCase
+
+import os
+import sys
+sys.path.append('../PyRoom')
+
+import tempfile
+
+# mock out gettext
+import __builtin__
+__builtin__._ = lambda str: str
+
+from PyRoom import file_viewer
+from PyRoom.file_viewer import MappedFile
+
+LINES = ''.join('line %d\n' % number for number in range(10))
+
+
+class TestMappedFileAcceptance(TestCase):
+
+    def setUp(self):
+        self.filepath = tempfile.mktemp()
+        self.limits = (file_viewer.WINDOW_LINES, file_viewer.PAGE_LINES,
+                       file_viewer.MAX_WINDOW_BYTES)
+        file_viewer.WINDOW_LINES = 4
+        file_viewer.PAGE_LINES = 2
+        self.mapped_files = []
+
+    def tearDown(self):
+        for mapped_file in self.mapped_files:
+            mapped_file.close()
+        (file_viewer.WINDOW_LINES, file_viewer.PAGE_LINES,
+         file_viewer.MAX_WINDOW_BYTES) = self.limits
+        if os.path.isfile(self.filepath):
+            os.remove(self.filepath)
+
+    def test_window_shows_the_first_lines(self):
+        mapped_file = self._map(LINES)
+
+        self.assertEquals(mapped_file.window_text(),
+                          u'line 0\nline 1\nline 2\nline 3\n')
+        self.assertEquals(mapped_file.slice_text(7, 13), u'line 1')
+
+    def test_paging_stops_at_the_start_and_the_end_of_the_file(self):
+        mapped_file = self._map(LINES)
+
+        self.assertEquals(mapped_file.page_up(), None)
+        self.assertEquals(mapped_file.page_down(), len('line 0\n') * 4)
+        self.assertEquals(mapped_file.window_text(),
+                          u'line 2\nline 3\nline 4\nline 5\n')
+        while mapped_file.page_down() is not None:
+            pass
+        self.assertEquals(mapped_file.window_end, len(LINES))
+        self.assertTrue(mapped_file.window_text().endswith(u'line 9\n'))
+
+        while mapped_file.page_up() is not None:
+            pass
+        self.assertEquals(mapped_file.window_start, 0)
+        self.assertEquals(mapped_file.window_text(),
+                          u'line 0\nline 1\nline 2\nline 3\n')
+
+    def test_window_never_splits_a_character(self):
+        file_viewer.MAX_WINDOW_BYTES = 5
+        text = u'\xe6\xf8\xe5\xe6\xf8\xe5'
+        mapped_file = self._map(text.encode('utf-8'))
+
+        windows = [mapped_file.window_text()]
+        while mapped_file.page_down() is not None:
+            windows.append(mapped_file.window_text())
+        while mapped_file.page_up() is not None:
+            windows.append(mapped_file.window_text())
+
+        self.assertEquals(windows[0], u'\xe6\xf8')
+        self.assertEquals(windows[-1], text[:2])
+        for window in windows:
+            self.assertTrue(window)
+            self.assertTrue(u'\ufffd' not in window)
+            self.assertTrue(window in text)
+
+    def test_char_offsets_count_characters_not_bytes(self):
+        mapped_file = self._map(u'\xe6\xf8\xe5\nabc\n'.encode('utf-8'))
+
+        self.assertEquals(mapped_file.char_offset_of(7), 4)
+
+    def test_empty_file_has_an_empty_window(self):
+        mapped_file = self._map('')
+
+        self.assertEquals(mapped_file.window_text(), u'')
+        self.assertEquals(mapped_file.page_down(), None)
+        self.assertEquals(mapped_file.page_up(), None)
+
+    def test_closed_file_is_unmapped(self):
+        mapped_file = MappedFile(self._write(LINES))
+        mapped_file.close()
+
+        self.assertRaises(ValueError, mapped_file.window_text)
+
+    def _map(self, data):
+        mapped_file = MappedFile(self._write(data))
+        self.mapped_files.append(mapped_file)
+        return mapped_file
+
+    def _write(self, data):
+        test_file = open(self.filepath, 'wb')
+        try:
+            test_file.write(data)
+        finally:
+            test_file.close()
+        return self.filepath
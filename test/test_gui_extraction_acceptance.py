@@ -10,6 +10,7 @@ __builtin__._ = lambda str: str
 
 import editor_input
 
+from PyRoom.gui import FadeLabel
 from PyRoom.gui import GUI
 from PyRoom.gui import MockGUI
 from PyRoom.gui import MockPreferences
@@ -206,3 +207,19 @@ class GUIExtractionAcceptanceTest(TestCase):
             self.mock_buffers[1].get_insert()
         )
         self.assertEquals(0.0, position)
+
+
+class FadeLabelAcceptanceTest(TestCase):
+
+    def test_fade_goes_on_after_switching_to_a_theme_with_fewer_steps(self):
+        label = FadeLabel('message', '#ffffff', '#000000')
+        label.get_mapped = lambda: True
+        label.fade_start()
+        for step in range(20):
+            label.fade_out()
+
+        label.set_colors('#ffffff', '#fafafa')
+
+        while label.fade_out():
+            pass
+        self.assertEquals(label.shown_color, label.fade_ramp[-1])
@@ -0,0 +1,77 @@
+from unittest import TestCase
+
+import os
+import shutil
+import socket
+import sys
+sys.path.append('../PyRoom')
+
+import tempfile
+import threading
+import time
+
+# mock out gettext
+import __builtin__
+__builtin__._ = lambda str: str
+
+import gobject
+
+from PyRoom import instance
+
+
+class TestInstanceAcceptance(TestCase):
+
+    def setUp(self):
+        self.runtime_directory = tempfile.mkdtemp()
+        self.xdg_runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+        os.environ['XDG_RUNTIME_DIR'] = self.runtime_directory
+
+    def tearDown(self):
+        if self.xdg_runtime_dir is None:
+            del os.environ['XDG_RUNTIME_DIR']
+        else:
+            os.environ['XDG_RUNTIME_DIR'] = self.xdg_runtime_dir
+        shutil.rmtree(self.runtime_directory)
+
+    def test_files_sent_by_a_later_pyroom_reach_the_running_one(self):
+        received = []
+        server = instance.InstanceServer(
+            lambda filenames, read_only: received.append(
+                (filenames, read_only)
+            )
+        )
+        answers = []
+        client = threading.Thread(target=lambda: answers.append(
+            instance.send_to_running_instance(
+                ['a file.txt', 'line\nbreak.txt'], read_only=True
+            )
+        ))
+        client.start()
+        context = gobject.main_context_default()
+        deadline = time.time() + 5
+        while (not received or client.isAlive()) and time.time() < deadline:
+            context.iteration(False)
+        client.join()
+        server.close()
+
+        self.assertEquals([True], answers)
+        self.assertEquals(
+            [([os.path.abspath('a file.txt'),
+               os.path.abspath('line\nbreak.txt')], True)],
+            received
+        )
+
+    def test_nobody_takes_the_files_when_no_pyroom_is_running(self):
+        self.assertFalse(instance.send_to_running_instance(['a file.txt']))
+
+    def test_server_without_unix_sockets_raises_an_environment_error(self):
+        af_unix = getattr(socket, 'AF_UNIX', None)
+        if af_unix is not None:
+            del socket.AF_UNIX
+        try:
+            self.assertRaises(EnvironmentError,
+                              instance.InstanceServer, lambda *args: None)
+            self.assertFalse(instance.send_to_running_instance(['file']))
+        finally:
+            if af_unix is not None:
+                socket.AF_UNIX = af_unix
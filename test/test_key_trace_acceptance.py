@@ -0,0 +1,78 @@
+import os
+import sys
+sys.path.append('../PyRoom')
+
+import tempfile
+import unittest
+
+# mock out gettext
+import __builtin__
+__builtin__._ = lambda str: str
+
+import gtk
+
+import editor_input
+
+from PyRoom import key_trace
+from PyRoom.factory import Factory
+from PyRoom.preferences import PyroomConfig
+
+
+class KeyTraceAcceptanceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = Factory()
+        self.trace_filepath = tempfile.mktemp()
+
+    def tearDown(self):
+        if os.path.isfile(self.trace_filepath):
+            os.remove(self.trace_filepath)
+
+    def test_replaying_a_recorded_session_gives_the_same_text(self):
+        editor = self._create_headless_editor()
+        recorder = key_trace.KeyTraceRecorder(editor, self.trace_filepath)
+        recorder.start()
+        editor_input.type_keys('Hello World', editor)
+        buf = editor.get_current_buffer()
+        buf.place_cursor_at_offset(5)
+        editor_input.type_keys(',', editor)
+        buf.delete_text(0, 1)
+        editor_input.type_keys('h', editor)
+        editor.run_key_command('control', gtk.keysyms.z)
+        recorder.stop()
+
+        replayed_editor = self._create_headless_editor()
+        key_trace.replay(
+            replayed_editor, key_trace.read_trace(self.trace_filepath)
+        )
+
+        self.assertEquals(
+            buf.get_text_from_buffer(),
+            editor_input.retrieve_current_buffer_text(replayed_editor)
+        )
+        self.assertEquals(
+            buf.get_cursor_offset(),
+            replayed_editor.get_current_buffer().get_cursor_offset()
+        )
+
+    def test_a_single_typed_key_marks_the_buffer_modified(self):
+        editor = self._create_headless_editor()
+
+        editor_input.type_keys('a', editor)
+
+        self.assertTrue(editor.get_current_buffer().modified)
+
+    def test_typed_keys_are_merged_into_one_undo_step_per_word(self):
+        editor = self._create_headless_editor()
+
+        editor_input.type_keys('two words', editor)
+        editor.undo()
+
+        self.assertEquals(
+            'two ', editor_input.retrieve_current_buffer_text(editor)
+        )
+
+    def _create_headless_editor(self):
+        pyroom_config = PyroomConfig()
+        pyroom_config.set('session', 'private', '1')
+        return self.factory.create_new_headless_editor(pyroom_config)
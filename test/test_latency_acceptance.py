@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+import sys
+sys.path.append('../PyRoom')
+
+# mock out gettext
+import __builtin__
+__builtin__._ = lambda str: str
+
+from PyRoom.latency import Histogram, LatencyMonitor
+
+
+class TestLatencyAcceptance(TestCase):
+
+    def test_percentiles_are_rounded_up_to_the_bucket(self):
+        histogram = Histogram()
+        for step in range(99):
+            histogram.add(0.000003)
+        histogram.add(0.5)
+
+        self.assertEquals(0.000004, histogram.percentile(50))
+        self.assertEquals(0.000004, histogram.percentile(99))
+        self.assertEquals(0.5, histogram.percentile(100))
+
+    def test_timed_handlers_are_counted_and_pass_results_through(self):
+        monitor = LatencyMonitor()
+        handler = monitor.timed('insert-text', lambda *args: args)
+
+        self.assertEquals((1, 2), handler(1, 2))
+        self.assertEquals(1, monitor.histogram('insert-text').count)
+        self.assertTrue(monitor.summary().startswith('insert-text '))
+
+    def test_only_keys_that_edit_the_buffer_are_timed_to_expose(self):
+        monitor = LatencyMonitor()
+        handler = monitor.timed_edit('insert-text', lambda *args: None)
+
+        monitor.key_pressed()
+        monitor.key_released()
+        monitor.exposed()
+        self.assertEquals(0, monitor.histogram('key-to-expose').count)
+
+        monitor.key_pressed()
+        handler()
+        monitor.key_released()
+        monitor.exposed()
+        self.assertEquals(1, monitor.histogram('key-to-expose').count)
@@ -2,6 +2,7 @@ import os
 import sys
 sys.path.append('../PyRoom')
 
+import shutil
 import unittest
 import tempfile
 
@@ -11,10 +12,13 @@ __builtin__._ = lambda str: str
 
 import editor_input
 
+import PyRoom.editor
 from PyRoom.factory import Factory
+from PyRoom.file_loader import BufferLoader
 from PyRoom.preferences import PyroomConfig
 
 from PyRoom.editor import FileStoreSession
+from PyRoom.session import file_fingerprint
 
 class SessionAcceptanceTest(unittest.TestCase):
 
@@ -35,6 +39,10 @@ class SessionAcceptanceTest(unittest.TestCase):
         if (os.path.isfile(self.test_filepath)):
             os.remove(self.test_filepath)
 
+        cache_directory = self.session_filepath + '.cache'
+        if os.path.isdir(cache_directory):
+            shutil.rmtree(cache_directory)
+
     def test_we_can_tell_the_editor_where_to_store_the_session(self):
         test_filepath = self._edit_test_file_and_save(self.editor)
 
@@ -57,6 +65,7 @@ class SessionAcceptanceTest(unittest.TestCase):
         editor_input.type_keys('Hello, how are you to day?', editor)
         editor.get_current_buffer().filename = saved_filepath
         editor.save_file_to_disk_and_session(),
+        editor.session.flush()
         del editor
 
         editor_restarted = self.factory.create_new_editor(self.pyroom_config)
@@ -82,6 +91,7 @@ class SessionAcceptanceTest(unittest.TestCase):
 
     def test_session_is_persisted_outside_editor(self):
         self.editor.open_file_and_add_to_session(self.test_filepath)
+        self.editor.session.flush()
         del self.editor
 
         restarted_editor = self.factory.create_new_editor(self.pyroom_config)
@@ -90,6 +100,7 @@ class SessionAcceptanceTest(unittest.TestCase):
 
     def test_editor_can_be_started_with_clean_session(self):
         self.editor.open_file_and_add_to_session(self.test_filepath)
+        self.editor.session.flush()
         del self.editor
 
         self.pyroom_config.clear_session = True
@@ -100,6 +111,7 @@ class SessionAcceptanceTest(unittest.TestCase):
 
     def test_buffers_are_opened_for_files_in_session(self):
         self.editor.open_file_and_add_to_session(self.test_filepath)
+        self.editor.session.flush()
         del self.editor
 
         restarted_editor = self.factory.create_new_editor(self.pyroom_config)
@@ -107,8 +119,93 @@ class SessionAcceptanceTest(unittest.TestCase):
         buffer_filenames = [buffer.filename for buffer in restarted_editor.buffers]
         self.assertTrue(self.test_filepath in buffer_filenames)
 
+    def test_only_the_shown_session_buffer_is_read_until_switched_to(self):
+        other_filepath = self._generate_temporary_filepath()
+        for filepath in (self.test_filepath, other_filepath):
+            with open(filepath, 'w') as session_file:
+                session_file.write('contents of %s' % filepath)
+            self.editor.open_file_and_add_to_session(filepath)
+        self.editor.session.flush()
+        del self.editor
+
+        restarted_editor = self.factory.create_new_editor(self.pyroom_config)
+        first_buffer, shown_buffer = restarted_editor.buffers
+        self.assertTrue(first_buffer.placeholder)
+        self.assertEquals(
+            'contents of %s' % other_filepath,
+            shown_buffer.get_text_from_buffer()
+        )
+
+        restarted_editor.next_buffer()
+        self.assertFalse(first_buffer.placeholder)
+        self.assertEquals(
+            'contents of %s' % self.test_filepath,
+            first_buffer.get_text_from_buffer()
+        )
+        os.remove(other_filepath)
+
+    def test_restored_buffer_has_cursor_and_cached_text_of_last_time(self):
+        with open(self.test_filepath, 'w') as session_file:
+            session_file.write('contents of the file')
+        editor = self.factory.create_new_headless_editor(self.pyroom_config)
+        editor.open_file_and_add_to_session(self.test_filepath)
+        editor.get_current_buffer().place_cursor_at_offset(9)
+        editor.quit()
+
+        loaded_filenames = []
+        def buffer_loader(buf, filename, *args, **kwargs):
+            loaded_filenames.append(filename)
+            return BufferLoader(buf, filename, *args, **kwargs)
+        PyRoom.editor.BufferLoader = buffer_loader
+        try:
+            restarted_editor = self.factory.create_new_editor(
+                self.pyroom_config
+            )
+        finally:
+            PyRoom.editor.BufferLoader = BufferLoader
+
+        restored_buffer = restarted_editor.get_current_buffer()
+        self.assertEquals([], loaded_filenames)
+        self.assertEquals(
+            'contents of the file', restored_buffer.get_text_from_buffer()
+        )
+        self.assertEquals(9, restored_buffer.get_cursor_offset())
+        self.assertFalse(restored_buffer.modified)
+
+    def test_session_is_stored_when_the_window_is_closed(self):
+        with open(self.test_filepath, 'w') as session_file:
+            session_file.write('contents of the file')
+        editor = self.factory.create_new_headless_editor(self.pyroom_config)
+        editor.open_file_and_add_to_session(self.test_filepath)
+        editor.get_current_buffer().place_cursor_at_offset(9)
+
+        # what the main loop ending without Editor.quit leads to
+        editor.shut_down_cleanly()
+
+        session = FileStoreSession(self.session_filepath)
+        self.assertEquals([self.test_filepath], session.get_open_filenames())
+        self.assertEquals(9, session.get_file_state(self.test_filepath)[0])
+
+    def test_text_of_a_file_changed_on_disk_is_not_cached(self):
+        with open(self.test_filepath, 'w') as session_file:
+            session_file.write('contents of the file')
+        editor = self.factory.create_new_headless_editor(self.pyroom_config)
+        editor.open_file_and_add_to_session(self.test_filepath)
+        with open(self.test_filepath, 'w') as session_file:
+            session_file.write('changed by another program')
+
+        editor.quit()
+
+        self.assertEquals(
+            None,
+            editor.session.get_cached_text(
+                self.test_filepath, file_fingerprint(self.test_filepath)
+            )
+        )
+
     def test_opening_buffers_during_init_does_not_readd_to_session(self):
         self.editor.open_file_and_add_to_session(self.test_filepath)
+        self.editor.session.flush()
         del self.editor
 
         restarted_editor = self.factory.create_new_editor(self.pyroom_config)
@@ -116,16 +213,63 @@ class SessionAcceptanceTest(unittest.TestCase):
         session_filenames = restarted_editor.session.get_open_filenames()
         self.assertEquals([self.test_filepath], session_filenames)
 
-    def test_shelf_is_created(self):
+    def test_session_file_is_created(self):
         session = FileStoreSession(self.session_filepath)
         session.clear()
-        self.assertEquals([], session.shelf['open_filenames'])
+        session.flush()
+        self.assertTrue(os.path.isfile(self.session_filepath))
+        self.assertEquals(
+            [],
+            FileStoreSession(self.session_filepath).get_open_filenames()
+        )
 
-    def test_shelf_can_add_and_initialize_is_fine(self):
+    def test_session_can_add_and_initialize_is_fine(self):
         session = FileStoreSession(self.session_filepath)
         session.add_open_filename('test/filename.txt')
+        session.flush()
         self.assertTrue(
-            'test/filename.txt' in session.shelf.get('open_filenames')
+            'test/filename.txt' in
+            FileStoreSession(self.session_filepath).get_open_filenames()
+        )
+
+    def test_session_ignores_a_line_torn_by_a_crash(self):
+        session = FileStoreSession(self.session_filepath)
+        session.add_open_filename('test/filename.txt')
+        session.add_open_filename('test/other.txt')
+        session.flush()
+        with open(self.session_filepath, 'ab') as session_file:
+            session_file.write('- test/filen')
+
+        self.assertEquals(
+            ['test/filename.txt', 'test/other.txt'],
+            FileStoreSession(self.session_filepath).get_open_filenames()
+        )
+
+    def test_changes_after_a_torn_line_are_kept(self):
+        session = FileStoreSession(self.session_filepath)
+        session.add_open_filename('test/filename.txt')
+        session.flush()
+        with open(self.session_filepath, 'ab') as session_file:
+            session_file.write('- test/filen')
+
+        session = FileStoreSession(self.session_filepath)
+        session.add_open_filename('test/other.txt')
+        session.flush()
+
+        self.assertEquals(
+            ['test/filename.txt', 'test/other.txt'],
+            FileStoreSession(self.session_filepath).get_open_filenames()
+        )
+
+    def test_shelf_of_older_versions_is_migrated(self):
+        import shelve
+        shelf = shelve.open(self.session_filepath)
+        shelf['open_filenames'] = ['test/filename.txt']
+        shelf.close()
+
+        self.assertEquals(
+            ['test/filename.txt'],
+            FileStoreSession(self.session_filepath).get_open_filenames()
         )
 
     def test_we_can_start_with_a_clean_session(self):
@@ -158,6 +302,7 @@ class SessionAcceptanceTest(unittest.TestCase):
         test_filepath = test_file.name
         test_file.write('this is the test contents oohh wee ooooo')
         editor.open_file_and_add_to_session(test_filepath)
+        editor.session.flush()
         return test_filepath
 
     def _create_user_session_editor(self, session_filepath):
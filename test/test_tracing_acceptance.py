@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+import os
+import sys
+sys.path.append('../PyRoom')
+
+import json
+import tempfile
+
+# mock out gettext
+import __builtin__
+__builtin__._ = lambda str: str
+
+from PyRoom import tracing
+from PyRoom.factory import Factory
+from PyRoom.preferences import PyroomConfig
+
+
+class TestTracingAcceptance(TestCase):
+
+    def setUp(self):
+        self.trace_filepath = tempfile.mktemp()
+        pyroom_config = PyroomConfig()
+        pyroom_config.set('session', 'private', '1')
+        self.editor = Factory().create_new_headless_editor(pyroom_config)
+
+    def tearDown(self):
+        tracing.tracer = None
+        if os.path.isfile(self.trace_filepath):
+            os.remove(self.trace_filepath)
+
+    def test_nothing_is_recorded_until_tracing_is_enabled(self):
+        self.editor.new_buffer()
+
+        self.assertEquals(None, tracing.tracer)
+
+    def test_editor_operations_are_dumped_as_trace_events(self):
+        tracing.enable()
+        self.editor.new_buffer()
+        self.editor.undo()
+        tracing.tracer.dump(self.trace_filepath)
+
+        with open(self.trace_filepath) as trace_file:
+            events = json.load(trace_file)['traceEvents']
+        self.assertEquals(
+            ['switch buffer', 'undo'],
+            [event['name'] for event in events]
+        )
+        self.assertEquals(['X', 'X'], [event['ph'] for event in events])
+
+    def test_only_the_most_recent_spans_are_kept(self):
+        tracer = tracing.Tracer(capacity=2)
+        for name in ('first', 'second', 'third'):
+            tracer.record(name, 'editor', 1.0, 2.0)
+
+        self.assertEquals(
+            ['second', 'third'],
+            [event['name'] for event in tracer.trace_events()]
+        )
@@ -0,0 +1,75 @@
+from unittest import TestCase
+
+import sys
+sys.path.append('../PyRoom')
+
+# mock out gettext
+import __builtin__
+__builtin__._ = lambda str: str
+
+from PyRoom.undo_journal import UndoJournal
+from PyRoom.undo_journal import RECORD_OVERHEAD
+
+
+class FakeRecord(object):
+    def __init__(self, text):
+        self.text = text
+
+    def text_size(self):
+        return len(self.text)
+
+
+class TestUndoJournalAcceptance(TestCase):
+
+    def test_journal_reports_bytes_held_by_history(self):
+        journal = UndoJournal()
+        journal.push_undo(FakeRecord('hello'))
+        journal.push_undo(FakeRecord('world!'))
+
+        self.assertEquals(journal.size, 2 * RECORD_OVERHEAD + 11)
+
+    def test_merged_text_is_accounted_for(self):
+        journal = UndoJournal()
+        record = FakeRecord('a')
+        journal.push_undo(record)
+        record.text += 'b'
+        journal.amend_last_undo(1)
+
+        self.assertEquals(journal.size, RECORD_OVERHEAD + 2)
+
+    def test_oldest_records_are_evicted_when_over_budget(self):
+        journal = UndoJournal(byte_budget=3 * (RECORD_OVERHEAD + 1))
+        records = [FakeRecord(char) for char in 'abcde']
+        for record in records:
+            journal.push_undo(record)
+
+        self.assertEquals(list(journal.undo_records), records[2:])
+        self.assertTrue(journal.size <= journal.byte_budget)
+
+    def test_last_record_survives_even_if_larger_than_budget(self):
+        journal = UndoJournal(byte_budget=RECORD_OVERHEAD)
+        journal.push_undo(FakeRecord('a'))
+        journal.push_undo(FakeRecord('a very long paragraph'))
+
+        self.assertEquals(len(journal), 1)
+        self.assertTrue(journal.can_undo)
+
+    def test_undo_and_redo_move_records_between_stacks(self):
+        journal = UndoJournal()
+        record = FakeRecord('word')
+        journal.push_undo(record)
+
+        self.assertEquals(journal.pop_undo(), record)
+        self.assertFalse(journal.can_undo)
+        self.assertTrue(journal.can_redo)
+        self.assertEquals(journal.pop_redo(), record)
+        self.assertTrue(journal.can_undo)
+
+    def test_clearing_redo_releases_its_bytes(self):
+        journal = UndoJournal()
+        journal.push_undo(FakeRecord('word'))
+        journal.pop_undo()
+        journal.clear_redo()
+
+        self.assertEquals(journal.size, 0)
+        self.assertFalse(journal.can_redo)
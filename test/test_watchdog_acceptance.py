@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+import os
+import sys
+sys.path.append('../PyRoom')
+
+import tempfile
+import time
+
+# mock out gettext
+import __builtin__
+__builtin__._ = lambda str: str
+
+from PyRoom.watchdog import Watchdog
+
+
+class TestWatchdogAcceptance(TestCase):
+
+    def setUp(self):
+        self.log_filepath = tempfile.mktemp()
+
+    def tearDown(self):
+        if os.path.isfile(self.log_filepath):
+            os.remove(self.log_filepath)
+
+    def test_a_stalled_main_thread_is_logged_with_its_stack(self):
+        watchdog = Watchdog(self.log_filepath, 0.05)
+        watchdog.start()
+        self._work_without_letting_the_main_loop_run()
+        watchdog._beat()
+        time.sleep(0.1)
+        watchdog.stop()
+
+        with open(self.log_filepath) as log:
+            logged = log.read()
+        self.assertTrue('main loop stalled for' in logged)
+        self.assertTrue('_work_without_letting_the_main_loop_run' in logged)
+
+    def _work_without_letting_the_main_loop_run(self):
+        time.sleep(0.3)